@@ -0,0 +1,233 @@
+# batch.py
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from html_parser import HTMLParser, Text
+
+# Extensions picked up when a directory is given as input.
+HTML_EXTENSIONS = (".html", ".htm", ".xhtml")
+
+
+def expand_inputs(sources):
+    """
+    Turn command-line inputs into a stream of document locations.
+    Each source can be:
+      - a directory (walked recursively for HTML files),
+      - a glob pattern (e.g. "archive/**/*.html"),
+      - "@list.txt", a file holding one URL or path per line,
+      - a single URL or file path.
+    Locations are yielded lazily so millions of inputs never sit in memory at once.
+    """
+    for source in sources:
+        if source.startswith("@"):
+            with open(source[1:], "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        yield line
+        elif "://" in source or source.startswith(("data:", "about:", "view-source:")):
+            yield source
+        elif os.path.isdir(source):
+            for dirpath, dirnames, filenames in os.walk(source):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.lower().endswith(HTML_EXTENSIONS):
+                        yield os.path.join(dirpath, name)
+        elif any(c in source for c in "*?["):
+            yield from sorted(glob.iglob(source, recursive=True))
+        else:
+            yield source
+
+
+def read_document(location):
+    """Return (body, byte_count) for a URL or a local file path."""
+    if "://" in location or location.startswith(("data:", "about:", "view-source:")):
+        from url import URL
+        # URL.request logs connections and caching with print(); stdout carries the JSON lines.
+        with contextlib.redirect_stdout(sys.stderr):
+            body = URL(location).request()
+        return body, len(body.encode("utf-8", errors="replace"))
+    with open(location, "rb") as f:
+        raw = f.read()
+    return raw.decode("utf-8", errors="replace"), len(raw)
+
+
+def tree_stats(root):
+    """Return (node_count, max_depth) without recursing, so deep documents are safe."""
+    if root is None:
+        return 0, 0
+    count = 0
+    max_depth = 0
+    stack = [(root, 1)]
+    while stack:
+        node, depth = stack.pop()
+        count += 1
+        if depth > max_depth:
+            max_depth = depth
+        for child in node.children:
+            stack.append((child, depth + 1))
+    return count, max_depth
+
+
+def serialize_tree(node):
+    """Convert a parsed node tree into plain dicts/strings suitable for JSON, without recursing."""
+    result = []
+    stack = [(node, result)]
+    while stack:
+        node, siblings = stack.pop()
+        if node is None or isinstance(node, Text):
+            siblings.append(None if node is None else node.text)
+            continue
+        children = []
+        siblings.append({"tag": node.tag, "attributes": node.attributes, "children": children})
+        stack.extend((child, children) for child in reversed(node.children))
+    return result[0]
+
+
+def tree_json(node):
+    """
+    The JSON text of serialize_tree(node), built without recursing. Deep
+    trees stay flat strings this way, which json.dumps and pickle (between
+    batch workers and the parent) could not handle as nested dicts.
+    """
+    parts = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, str):
+            parts.append(node)  # Punctuation pushed below
+        elif node is None or isinstance(node, Text):
+            parts.append(json.dumps(None if node is None else node.text))
+        else:
+            parts.append(f'{{"tag": {json.dumps(node.tag)}, "attributes": {json.dumps(node.attributes)}, '
+                         f'"children": [')
+            stack.append("]}")
+            for i in range(len(node.children) - 1, -1, -1):
+                stack.append(node.children[i])
+                if i:
+                    stack.append(", ")
+    return "".join(parts)
+
+
+def record_json(result):
+    """One JSON line for a result record; a "tree" held as JSON text (see tree_json) is spliced in as is."""
+    tree = result.get("tree")
+    if not isinstance(tree, str):
+        return json.dumps(result)
+    rest = {key: value for key, value in result.items() if key != "tree"}
+    return json.dumps(rest)[:-1] + ', "tree": ' + tree + "}"
+
+
+def parse_one(location, emit_tree=False, max_bytes=None, tree_text=False):
+    """
+    Parse a single document and return a JSON-friendly result record. With
+    tree_text, the emitted tree is its JSON text (see tree_json) rather than dicts.
+    """
+    result = {"source": location}
+    try:
+        body, size = read_document(location)
+        result["bytes"] = size
+        if max_bytes is not None and size > max_bytes:
+            result["error"] = f"skipped: {size} bytes exceeds limit of {max_bytes}"
+            return result
+        start = time.perf_counter()
+        root = HTMLParser(body).parse()
+        result["parse_time"] = time.perf_counter() - start
+        result["nodes"], result["depth"] = tree_stats(root)
+        if emit_tree:
+            result["tree"] = tree_json(root) if tree_text else serialize_tree(root)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def parse_chunk(locations, emit_tree=False, max_bytes=None):
+    """
+    Worker entry point: parse a chunk of documents, keeping only the small
+    result records. Trees come back as JSON text; write records with record_json().
+    """
+    return [parse_one(location, emit_tree, max_bytes, tree_text=True) for location in locations]
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(locations, workers=None, chunk_size=16, emit_tree=False,
+              max_bytes=None, max_tasks_per_child=None):
+    """
+    Parse documents across a process pool and yield result records as they complete.
+    Work is handed out in chunks and at most two chunks per worker are in flight,
+    so the pending queue stays bounded no matter how many inputs there are.
+    max_tasks_per_child recycles workers to cap their memory growth.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = chunked(locations, chunk_size)
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=max_tasks_per_child) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(parse_chunk, chunk, emit_tree, max_bytes))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Parse many HTML documents in parallel and emit JSON lines.")
+    parser.add_argument("sources", nargs="+",
+                        help="directories, glob patterns, URLs, file paths or @url-list files")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=16,
+                        help="documents handed to a worker at a time")
+    parser.add_argument("--max-tasks-per-child", type=int, default=None,
+                        help="restart a worker after this many chunks to bound its memory")
+    parser.add_argument("--max-bytes", type=int, default=None,
+                        help="skip documents larger than this many bytes")
+    parser.add_argument("--tree", action="store_true",
+                        help="also emit the serialized node tree for each document")
+    parser.add_argument("--output", "-o", default="-",
+                        help="output file for JSON lines (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    documents = errors = total_bytes = 0
+    start = time.perf_counter()
+    try:
+        for result in run_batch(expand_inputs(args.sources), args.workers, args.chunk_size,
+                                args.tree, args.max_bytes, args.max_tasks_per_child):
+            documents += 1
+            total_bytes += result.get("bytes", 0)
+            if "error" in result:
+                errors += 1
+            out.write(record_json(result) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    rate = documents / elapsed if elapsed > 0 else 0.0
+    print(f"Parsed {documents} documents ({errors} errors, {total_bytes} bytes) "
+          f"in {elapsed:.2f}s ({rate:.1f} docs/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
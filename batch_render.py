@@ -0,0 +1,242 @@
+# batch_render.py
+import argparse
+import json
+import math
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import url
+from batch import chunked, expand_inputs, read_document
+from font_metrics import HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import WIDTH, Layout
+from layout_cache import LayoutCache, content_key
+from style import compute_styles
+from view_source import SourceLayout
+
+# Seconds one document may take (fetch through layout) before it is abandoned.
+DEFAULT_TIMEOUT = 30
+# Latency percentiles reported at the end of a run.
+PERCENTILES = (50, 90, 99)
+
+# Per-process state, set up by init_worker().
+worker_metrics = None
+worker_cache = None
+# True only while render_one's timer is armed, so a late signal is ignored.
+alarm_armed = False
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    if alarm_armed:
+        raise RenderTimeout()
+
+
+def init_worker(metrics_path=None, cache_dir=None):
+    """Create the process's headless metrics and, with a directory, its on-disk layout cache."""
+    global worker_metrics, worker_cache
+    worker_metrics = HeadlessFontMetrics.from_file(metrics_path) if metrics_path else HeadlessFontMetrics()
+    worker_cache = LayoutCache(directory=cache_dir) if cache_dir else None
+    if hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGALRM, on_alarm)
+
+
+def display_list_json(display_list):
+    """The display list's columns as plain lists, with fonts and colors interned as in DisplayList."""
+    return {
+        "xs": display_list.xs.tolist(),
+        "ys": display_list.ys.tolist(),
+        "texts": display_list.texts,
+        "font_ids": display_list.font_ids.tolist(),
+        "color_ids": display_list.color_ids.tolist(),
+        "emoji": list(display_list.emoji),
+        "fonts": display_list.fonts,
+        "colors": display_list.colors,
+    }
+
+
+def render_document(location, width, result):
+    """Fetch, parse, style and lay out one document into result; returns the display list."""
+    times = result["times"] = {}
+    start = time.perf_counter()
+    view_source = location.startswith("view-source:")
+    body, result["bytes"] = read_document(location)
+    times["fetch"] = time.perf_counter() - start
+    content = content_key(body, "view-source" if view_source else "html")
+    if worker_cache is not None:
+        display_list = worker_cache.get(content, width, worker_metrics)
+        if display_list is not None:
+            result["cached"] = True
+            return display_list
+    if view_source:
+        start = time.perf_counter()
+        display_list = SourceLayout(body, width, worker_metrics).display_list
+        times["layout"] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        root = HTMLParser(body).parse()
+        times["parse"] = time.perf_counter() - start
+        start = time.perf_counter()
+        compute_styles(root)
+        times["style"] = time.perf_counter() - start
+        start = time.perf_counter()
+        display_list = Layout(root, width, worker_metrics).display_list
+        times["layout"] = time.perf_counter() - start
+    if worker_cache is not None:
+        worker_cache.put(content, width, worker_metrics, display_list)
+    return display_list
+
+
+def render_one(location, width=WIDTH, timeout=DEFAULT_TIMEOUT, emit_display_list=False):
+    """Render a single document headlessly and return a JSON-friendly result record."""
+    global alarm_armed
+    if worker_metrics is None:
+        init_worker()
+    result = {"source": location, "width": width}
+    start = time.perf_counter()
+    # SIGALRM interrupts the worker's main thread, including blocking socket reads.
+    alarm = timeout and hasattr(signal, "setitimer")
+    try:
+        try:
+            if alarm:
+                alarm_armed = True
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            display_list = render_document(location, width, result)
+        finally:
+            # Disarm before anything else runs: an alarm raised from the
+            # handlers below would escape render_one and fail the whole chunk.
+            # Clearing the flag first makes a signal already on its way a no-op.
+            if alarm:
+                alarm_armed = False
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        result["entries"] = len(display_list)
+        result["height"] = display_list.height
+        if emit_display_list:
+            result["display_list"] = display_list_json(display_list)
+    except RenderTimeout:
+        result["error"] = f"timeout: exceeded {timeout}s"
+        result["timeout"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    if "error" in result:
+        # The interrupted fetch may have left a connection mid-response; never
+        # let the next document from that host read its leftover bytes.
+        url.close_connections()
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+def render_chunk(locations, width=WIDTH, timeout=DEFAULT_TIMEOUT, emit_display_list=False):
+    """Worker entry point: render a chunk of documents, each under its own timeout."""
+    return [render_one(location, width, timeout, emit_display_list) for location in locations]
+
+
+def run_render_batch(locations, width=WIDTH, workers=None, chunk_size=4, timeout=DEFAULT_TIMEOUT,
+                     emit_display_list=False, metrics_path=None, cache_dir=None, max_tasks_per_child=None):
+    """
+    Render documents across a process pool and yield result records as they
+    complete, keeping at most two chunks per worker in flight (see batch.run_batch).
+    With cache_dir, workers share finished layouts through an on-disk LayoutCache.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(metrics_path, cache_dir),
+                             max_tasks_per_child=max_tasks_per_child) as pool:
+        pending = set()
+        for chunk in chunked(locations, chunk_size):
+            pending.add(pool.submit(render_chunk, chunk, width, timeout, emit_display_list))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in pending:
+            yield from future.result()
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(results, elapsed):
+    """Throughput and latency percentiles (in seconds) for a finished run."""
+    latencies = sorted(result["total"] for result in results if "error" not in result)
+    total_bytes = sum(result.get("bytes", 0) for result in results)
+    summary = {
+        "documents": len(results),
+        "errors": sum(1 for result in results if "error" in result),
+        "timeouts": sum(1 for result in results if result.get("timeout")),
+        "cached": sum(1 for result in results if result.get("cached")),
+        "bytes": total_bytes,
+        "elapsed": elapsed,
+        "docs_per_second": len(results) / elapsed if elapsed > 0 else 0.0,
+        "bytes_per_second": total_bytes / elapsed if elapsed > 0 else 0.0,
+    }
+    for p in PERCENTILES:
+        summary[f"p{p}"] = percentile(latencies, p)
+    summary["max"] = latencies[-1] if latencies else 0.0
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fetch, parse and lay out many documents without a display and emit JSON lines.")
+    parser.add_argument("sources", nargs="+",
+                        help="directories, glob patterns, URLs, file paths or @url-list files")
+    parser.add_argument("--width", type=int, default=WIDTH, help=f"layout width in pixels (default: {WIDTH})")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=4,
+                        help="documents handed to a worker at a time")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"seconds allowed per document, 0 for none (default: {DEFAULT_TIMEOUT})")
+    parser.add_argument("--max-tasks-per-child", type=int, default=None,
+                        help="restart a worker after this many chunks to bound its memory")
+    parser.add_argument("--display-list", action="store_true",
+                        help="emit each document's display list, not just summary stats")
+    parser.add_argument("--metrics", default=None, help="JSON font metrics file for HeadlessFontMetrics")
+    parser.add_argument("--layout-cache", default=None, metavar="DIR",
+                        help="reuse finished layouts from (and store them in) this directory")
+    parser.add_argument("--output", "-o", default="-",
+                        help="output file for JSON lines (default: stdout)")
+    parser.add_argument("--summary", default=None, metavar="PATH", help="also write the run summary as JSON")
+    args = parser.parse_args(argv)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    results = []
+    start = time.perf_counter()
+    try:
+        for result in run_render_batch(expand_inputs(args.sources), args.width, args.workers, args.chunk_size,
+                                       args.timeout, args.display_list, args.metrics, args.layout_cache,
+                                       args.max_tasks_per_child):
+            out.write(json.dumps(result) + "\n")
+            # Keep only what the summary needs, not the display lists.
+            results.append({key: result[key] for key in ("total", "bytes", "error", "timeout", "cached")
+                            if key in result})
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    summary = summarize(results, time.perf_counter() - start)
+    print(f"Rendered {summary['documents']} documents ({summary['errors']} errors, "
+          f"{summary['timeouts']} timeouts, {summary['cached']} from the layout cache) "
+          f"in {summary['elapsed']:.2f}s ({summary['docs_per_second']:.1f} docs/s, "
+          f"{summary['bytes_per_second'] / 1e6:.2f} MB/s)", file=sys.stderr)
+    print("Latency: " + ", ".join(f"p{p} {summary[f'p{p}'] * 1000:.1f} ms" for p in PERCENTILES)
+          + f", max {summary['max'] * 1000:.1f} ms", file=sys.stderr)
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
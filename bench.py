@@ -0,0 +1,399 @@
+# bench.py
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_server import BenchServer
+from font_metrics import HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import Layout, lex
+from renderer import RetainedRenderer
+from style import StyleCache, compute_styles
+from url import URL
+from view_source import SourceLayout
+
+# Approximate corpus sizes in bytes. The large ones are opt-in (--sizes).
+SIZES = {
+    "small": 16 * 1024,
+    "medium": 1024 * 1024,
+    "large": 32 * 1024 * 1024,
+    "huge": 256 * 1024 * 1024,
+}
+DEFAULT_SIZES = ["small", "medium"]
+WIDTH = 800
+VIEWPORT_HEIGHT = 600
+# Render benchmark: scroll a page by half a screen per frame, up to this many frames.
+MAX_FRAMES = 2000
+# A benchmark regresses when it is this much slower than the baseline
+# (as a fraction) and also slower by at least MIN_DELTA seconds.
+TOLERANCE = 0.25
+MIN_DELTA = 0.002
+
+WORDS = ("the of and to in is was for on that with as by at from his her it an were are which this be "
+         "or has had one their not but also after new first two its who they been more than other "
+         "browser layout render parser token element style window canvas scroll cache measure "
+         "international performance configuration documentation").split()
+
+
+def words(rng, n):
+    return " ".join(rng.choice(WORDS) for i in range(n))
+
+
+# Corpus generators: each returns one block of markup; blocks are repeated
+# (with a seeded random source) until the corpus reaches its size.
+
+def article_block(rng):
+    """Real-world-shaped content: headings, styled paragraphs, links, lists, comments."""
+    items = "".join(f"<li><a href=\"/p/{rng.randrange(1000)}\">{words(rng, 3)}</a></li>" for i in range(5))
+    return (f"<h1>{words(rng, 5)}</h1>\n"
+            f"<p style=\"color: gray; font-size: 14px\">By <a href=\"#\">{words(rng, 2)}</a></p>\n"
+            f"<p>{words(rng, 40)} <b>{words(rng, 4)}</b> {words(rng, 30)} <i>{words(rng, 3)}</i> "
+            f"<small>{words(rng, 6)}</small> {words(rng, 20)}</p>\n"
+            f"<!-- section {rng.randrange(1000)} -->\n"
+            f"<div><ul>{items}</ul><p>{words(rng, 25)} <span style=\"font-weight: bold\">"
+            f"{words(rng, 5)}</span> <big>{words(rng, 2)}</big></p></div>\n")
+
+
+def deep_nesting_block(rng, depth=100):
+    """A subtree 100 elements deep with text at every level."""
+    tags = [rng.choice(("div", "span", "b", "i", "div")) for i in range(depth)]
+    opening = "".join(f"<{tag}>{words(rng, 2)} " for tag in tags)
+    closing = "".join(f"</{tag}>" for tag in reversed(tags))
+    return opening + words(rng, 5) + closing + "\n"
+
+
+def tag_soup_block(rng):
+    """Mis-nested, unclosed and unknown tags, stray end tags and bare attributes."""
+    return (f"<p>{words(rng, 8)} <b>{words(rng, 3)} <i>{words(rng, 3)}</b> {words(rng, 3)}</i> "
+            f"{words(rng, 5)}<p>{words(rng, 6)} <li>{words(rng, 4)}<li>{words(rng, 4)} "
+            f"<div>{words(rng, 5)}</div><p>{words(rng, 4)} <a href=x>{words(rng, 3)}<p>{words(rng, 3)}</a> "
+            f"<table><tr><td>{words(rng, 2)}</table> &amp; </b></i></span> <br> <img src=a.png> "
+            f"<unknown attr>{words(rng, 3)}</unknown> <font size=3 color=red>{words(rng, 4)}\n")
+
+
+def script_heavy_block(rng):
+    """
+    Inline scripts and styles containing markup-like text, between small bits
+    of content. The parser has no raw-text mode, so a bare < or > in script
+    or style text would open an element that never closes and the tree would
+    deepen with every block; the markup inside is kept balanced instead.
+    """
+    return (f"<script>var data_{rng.randrange(10**6)} = [1, 2, 3].filter(function (x) {{ return x % 2; }});\n"
+            f"if (data.length) {{ document.write('<p>{words(rng, 4)}</p>'); }}\n"
+            f"function f() {{ return \"<div>\" + '<!-- not a comment -->' + \"</div>\"; }}</script>\n"
+            f"<style>p a {{ color: red }} .x {{ font-size: 12px }}</style>\n"
+            f"<p>{words(rng, 15)}</p><noscript>{words(rng, 3)}</noscript>\n")
+
+
+CORPORA = {
+    "article": article_block,
+    "long_text": None,  # One paragraph of plain words, see make_corpus
+    "deep_nesting": deep_nesting_block,
+    "tag_soup": tag_soup_block,
+    "script_heavy": script_heavy_block,
+}
+
+
+def make_corpus(kind, size, seed=0):
+    """Generate about size bytes of HTML of the given kind, deterministically."""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    if kind == "long_text":
+        parts.append("<p>")
+        while total < size:
+            part = words(rng, 500) + " "
+            parts.append(part)
+            total += len(part)
+        parts.append("</p>")
+        return "".join(parts)
+    block = CORPORA[kind]
+    while total < size:
+        part = block(rng)
+        parts.append(part)
+        total += len(part)
+    return "".join(parts)
+
+
+class NullCanvas:
+    """Canvas stand-in for the render benchmark: accepts the renderer's calls and does nothing."""
+
+    def __init__(self):
+        self.next_id = 0
+
+    def create_text(self, *args, **options):
+        self.next_id += 1
+        return self.next_id
+
+    create_image = create_rectangle = create_text
+
+    def delete(self, *args, **options):
+        pass
+
+    move = coords = itemconfigure = tag_raise = delete
+
+
+def render_pass(display_list):
+    """Scroll a retained renderer through a page, half a screen per frame."""
+    renderer = RetainedRenderer(NullCanvas())
+    renderer.set_display_list(display_list)
+    step = VIEWPORT_HEIGHT // 2
+    for frame in range(min(MAX_FRAMES, display_list.height // step + 1)):
+        renderer.render(frame * step, WIDTH, VIEWPORT_HEIGHT)
+
+
+def fetch(url_str):
+    # URL.request prints connection reuse; keep it out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return URL(url_str).request()
+
+
+class Corpus:
+    """A generated document plus the intermediate results other benchmarks start from."""
+
+    def __init__(self, kind, size_name, server):
+        self.kind = kind
+        self.size_name = size_name
+        self.body = make_corpus(kind, SIZES[size_name])
+        self.name = f"{kind}/{size_name}"
+        self.server = server
+        self.server.add(self.name.replace("/", "-"), self.body)
+        self._root = self._layout = None
+
+    def root(self):
+        if self._root is None:
+            self._root = HTMLParser(self.body).parse()
+            compute_styles(self._root, cache=StyleCache())
+        return self._root
+
+    def layout(self):
+        if self._layout is None:
+            self._layout = Layout(self.root(), WIDTH, HeadlessFontMetrics())
+        return self._layout
+
+    def url(self, mode):
+        return self.server.url(mode, self.name.replace("/", "-"))
+
+
+# name -> (setup(corpus) -> argument, timed function(argument)).
+# Only the timed function is measured; setup results are shared per corpus.
+BENCHMARKS = {
+    "lex": (lambda corpus: corpus.body, lex),
+    "parse": (lambda corpus: corpus.body, lambda body: HTMLParser(body).parse()),
+    "style": (lambda corpus: corpus.root(), lambda root: compute_styles(root, cache=StyleCache())),
+    "layout": (lambda corpus: corpus.root(), lambda root: Layout(root, WIDTH, HeadlessFontMetrics())),
+    "reflow": (lambda corpus: corpus.layout(),
+               lambda layout: (layout.reflow(WIDTH // 2), layout.reflow(WIDTH))),
+    "view_source": (lambda corpus: corpus.body, lambda body: SourceLayout(body, WIDTH, HeadlessFontMetrics())),
+    "render": (lambda corpus: corpus.layout().display_list, render_pass),
+    "fetch_plain": (lambda corpus: corpus.url("plain"), fetch),
+    "fetch_chunked": (lambda corpus: corpus.url("chunked"), fetch),
+    "fetch_gzip": (lambda corpus: corpus.url("gzip"), fetch),
+}
+
+
+# Cold-start paths, each timed as a fresh interpreter running the snippet
+# from the repository directory. "python" is the bare interpreter, for scale.
+STARTUP_PATHS = {
+    "python": "",
+    "url": "from url import URL; URL('http://example.org/index.html')",
+    "parser": "from html_parser import HTMLParser; HTMLParser('<p>Hello <b>world</b></p>').parse()",
+    "headless_layout": ("from font_metrics import HeadlessFontMetrics; from html_parser import HTMLParser; "
+                        "from layout import Layout; "
+                        "Layout(HTMLParser('<p>Hello <b>world</b></p>').parse(), 800, HeadlessFontMetrics())"),
+    # Everything main.py imports before opening a window (which needs a display).
+    "browser": "import tkinter, memory, profiler; from browser import Browser; from url import URL",
+}
+# Imports that headless paths should not pay for; reported per startup path.
+HEAVY_MODULES = ("tkinter", "ssl", "gzip", "socket", "numpy")
+
+
+def time_startup(code, repeat):
+    """Wall times of fresh interpreters running code, and the heavy modules it imported."""
+    probe = code + "\nimport sys\nprint(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        done = subprocess.run([sys.executable, "-c", probe], cwd=directory, capture_output=True, text=True,
+                              check=True)
+        times.append(time.perf_counter() - start)
+    return times, [name for name in done.stdout.strip().split(",") if name]
+
+
+def run_startup(repeat=5, log=None):
+    """Time every STARTUP_PATHS entry; returns {"startup/path": result} like run_benchmarks."""
+    results = {}
+    for path_name, code in STARTUP_PATHS.items():
+        times, modules = time_startup(code, repeat)
+        name = f"startup/{path_name}"
+        results[name] = {
+            "bytes": 0,
+            "repeat": repeat,
+            "min": min(times),
+            "median": statistics.median(times),
+            "mb_per_s": None,
+            "modules": modules,
+        }
+        if log:
+            log(f"{name:40} {min(times) * 1000:10.2f} ms  {' '.join(modules)}")
+    return results
+
+
+def time_call(fn, arg, repeat):
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(corpora, sizes, benchmarks, repeat=3, log=None):
+    """Run every benchmark on every corpus; returns {"corpus/size/benchmark": result}."""
+    results = {}
+    with BenchServer() as server:
+        for size_name in sizes:
+            for kind in corpora:
+                corpus = Corpus(kind, size_name, server)
+                for bench_name in benchmarks:
+                    setup, fn = BENCHMARKS[bench_name]
+                    name = f"{corpus.name}/{bench_name}"
+                    try:
+                        times = time_call(fn, setup(corpus), repeat)
+                    except Exception as e:
+                        # Record the failure and keep going, so one broken
+                        # benchmark never costs the results of the others.
+                        results[name] = {"bytes": len(corpus.body), "error": f"{type(e).__name__}: {e}"}
+                        if log:
+                            log(f"{name:40} FAILED {results[name]['error']}")
+                        continue
+                    best = min(times)
+                    results[name] = {
+                        "bytes": len(corpus.body),
+                        "repeat": repeat,
+                        "min": best,
+                        "median": statistics.median(times),
+                        "mb_per_s": len(corpus.body) / best / 1e6 if best > 0 else None,
+                    }
+                    if log:
+                        log(f"{name:40} {best * 1000:10.2f} ms")
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_delta=MIN_DELTA):
+    """
+    Compare best times against a baseline. Returns (name, baseline seconds,
+    current seconds, ratio, status) rows; status is "regressed", "improved",
+    "ok", "new" or "failed" (the benchmark raised an error).
+    """
+    rows = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if "error" in result:
+            rows.append((name, base.get("min") if base else None, None, None, "failed"))
+            continue
+        if base is None or "min" not in base:
+            rows.append((name, None, result["min"], None, "new"))
+            continue
+        ratio = result["min"] / base["min"] if base["min"] > 0 else float("inf")
+        delta = result["min"] - base["min"]
+        if ratio > 1 + tolerance and delta > min_delta:
+            status = "regressed"
+        elif ratio < 1 / (1 + tolerance) and -delta > min_delta:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, base["min"], result["min"], ratio, status))
+    return rows
+
+
+def report(results):
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def parse_list(value, choices):
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in names if name not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown: {', '.join(unknown)} (choose from {', '.join(choices)})")
+    return names
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark lexing, parsing, styling, layout, view-source, rendering and fetching.")
+    parser.add_argument("--sizes", type=lambda v: parse_list(v, SIZES), default=DEFAULT_SIZES,
+                        help=f"comma-separated corpus sizes ({', '.join(SIZES)}; default: small,medium)")
+    parser.add_argument("--corpora", type=lambda v: parse_list(v, CORPORA), default=list(CORPORA),
+                        help="comma-separated corpus kinds (default: all)")
+    parser.add_argument("--benchmarks", type=lambda v: parse_list(v, BENCHMARKS), default=list(BENCHMARKS),
+                        help="comma-separated benchmarks (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark; the best counts (default: 3)")
+    parser.add_argument("--startup", action="store_true",
+                        help="also time cold startup of the URL, parser, headless layout and browser paths")
+    parser.add_argument("--startup-only", action="store_true", help="only run the startup benchmarks")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a results file and fail on regressions")
+    parser.add_argument("--save-baseline", help="also write the results to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help=f"allowed slowdown as a fraction (default: {TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    log = lambda line: print(line, file=sys.stderr)
+    results = {}
+    if not args.startup_only:
+        results.update(run_benchmarks(args.corpora, args.sizes, args.benchmarks, args.repeat, log=log))
+    if args.startup or args.startup_only:
+        results.update(run_startup(max(args.repeat, 5), log=log))
+    data = report(results)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+    if not args.output:
+        json.dump(data, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        rows = compare(results, baseline, args.tolerance)
+        regressions = [row for row in rows if row[4] == "regressed"]
+        for name, base, current, ratio, status in rows:
+            if status == "failed":
+                print(f"{name:40} {results[name]['error']}  failed", file=sys.stderr)
+            elif status == "new":
+                print(f"{name:40} {'':>10} {current * 1000:10.2f} ms  new", file=sys.stderr)
+            else:
+                print(f"{name:40} {base * 1000:10.2f} {current * 1000:10.2f} ms  x{ratio:.2f}  {status}",
+                      file=sys.stderr)
+        if regressions:
+            print(f"FAIL: {len(regressions)} benchmark(s) slower than baseline by more than "
+                  f"{args.tolerance:.0%}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+    failed = [name for name, result in results.items() if "error" in result]
+    if failed:
+        print(f"FAIL: {len(failed)} benchmark(s) raised errors: {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# bench_server.py
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import url
+
+# Bytes per chunk for the chunked transfer-encoding route.
+CHUNK_SIZE = 16 * 1024
+
+
+class BenchHandler(BaseHTTPRequestHandler):
+    """
+    Serves the fixture's documents as /<mode>/<name>, where mode is
+      plain    Content-Length body
+      chunked  Transfer-Encoding: chunked in CHUNK_SIZE pieces
+      gzip     gzip Content-Encoding with Content-Length
+    over HTTP/1.1 keep-alive. Responses are marked no-store, so URL.request
+    fetches them every time instead of answering from its response cache.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40 ms to some responses.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/", 1)
+        body = self.server.documents.get(parts[1]) if len(parts) == 2 else None
+        if body is None or parts[0] not in ("plain", "chunked", "gzip"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        mode = parts[0]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Cache-Control", "no-store")
+        if mode == "chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(body), CHUNK_SIZE):
+                chunk = body[start:start + CHUNK_SIZE]
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if mode == "gzip":
+            body = self.server.gzipped[parts[1]]
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean.
+
+
+class BenchServer(ThreadingHTTPServer):
+    """Local HTTP server fixture for fetch benchmarks; use as a context manager."""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), BenchHandler)
+        self.documents = {}  # name -> UTF-8 bytes
+        self.gzipped = {}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def add(self, name, html):
+        self.documents[name] = html.encode("utf-8")
+        # Compress up front; the benchmark measures the client, not the server.
+        self.gzipped[name] = gzip.compress(self.documents[name], compresslevel=6)
+
+    def url(self, mode, name):
+        host, port = self.server_address
+        return f"http://{host}:{port}/{mode}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+        # Drop the client's pooled keep-alive connection to this server.
+        host, port = self.server_address
+        s = url.connection_pool.pop(("http", host, port), None)
+        if s is not None:
+            s.close()
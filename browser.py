@@ -1,92 +1,339 @@
 # browser.py
+import time
 import tkinter
-import tkinter.font
 from layout import WIDTH, HEIGHT, SCROLL_STEP
-from html_parser import HTMLParser
+from font_metrics import TK_METRICS
 from layout import Layout
+from layout_cache import LAYOUT_CACHE
+from loader import POLL_INTERVAL, PageLoader
+from renderer import OVERSCAN, RetainedRenderer
+from scheduler import TARGET_FPS, FrameScheduler
+from history import PageCache
+from memory import enforce_limits, memory_report, track_stage
+from profiler import span
+from tabs import MEMORY_BUDGET, Tab, shared_cache_bytes, tabs_to_discard
+
+# Milliseconds to wait after the last <Configure> event before relaying out.
+RESIZE_DELAY = 50
+# Seconds of layout work per event-loop turn while a page streams in, and
+# how often the growing page is repainted after its first screenful.
+STREAM_SLICE = 0.008
+STREAM_PAINT_INTERVAL = 0.1
 
 class Browser:
-    def __init__(self):
-        self.display_list = None
-        self.nodes = None  # Will hold the root node of the parsed HTML tree.
+    def __init__(self, overscan=OVERSCAN, fps=TARGET_FPS, memory_budget=MEMORY_BUDGET, memory_limits=None):
+        self.tabs = []
+        self.tab = None  # The tab being shown; every document lives in a Tab.
+        self.activations = 0
+        self.memory_budget = memory_budget
+        self.memory_limits = memory_limits or {}  # Cache -> soft limit in bytes, see memory.enforce_limits
+        self.page_cache = PageCache()  # Back/forward cache shared by all tabs
+        self.layout_cache = LAYOUT_CACHE  # Display lists by (content, width, fonts)
+        self.resize_job = None
+        self.pending_width = None
         self.window = tkinter.Tk()
         self.canvas = tkinter.Canvas(self.window, width=WIDTH, height=HEIGHT)
         self.canvas.pack(fill="both", expand=True)
-        self.scroll = 0
+        self.renderer = RetainedRenderer(self.canvas, overscan)
+        self.pending_scroll = 0  # Scroll input not yet applied by a frame
+        self.frames = FrameScheduler(self.window, self.frame, fps)
 
         self.window.bind("<KeyPress-Down>", self.scrolldown)
         self.window.bind("<KeyPress-Up>", self.scrollup)
         self.window.bind("<MouseWheel>", self.on_mousewheel)
         self.window.bind("<Button-4>", self.on_mousewheel_up)
         self.window.bind("<Button-5>", self.on_mousewheel_down)
+        self.window.bind("<Control-Next>", self.next_tab)
+        self.window.bind("<Control-Prior>", self.previous_tab)
+        self.window.bind("<Control-w>", self.close_tab)
+        self.window.bind("<Alt-Left>", self.go_back)
+        self.window.bind("<Alt-Right>", self.go_forward)
         self.canvas.bind("<Configure>", self.on_configure)
 
     def load(self, url):
-        body = url.request()
-        # Build the HTML node tree using our parser.
-        self.nodes = HTMLParser(body).parse()
-        # Create the layout using the node tree.
-        self.display_list = Layout(self.nodes, self.canvas.winfo_width()).display_list
-        self.draw()
+        """Navigate the current tab to url (opening the first tab if needed)."""
+        if self.tab is None:
+            self.new_tab(url)
+            return
+        tab = self.tab
+        self.save_page(tab)
+        self.page_cache.drop(tab.history.visit(url))
+        tab.url = url
+        tab.scroll = 0
+        self.start_load(tab)
 
-    def draw(self):
-        self.canvas.delete("all")
-        for x, y, txt, font, is_emoji in self.display_list:
-            if y - self.scroll > self.canvas.winfo_height() or y - self.scroll < 0:
-                continue
-            if is_emoji:
-                # If emojis were supported, draw them appropriately.
-                # self.canvas.create_image(x, y - self.scroll, image=img, anchor="nw")
+    def save_page(self, tab):
+        """Remember the scroll position of the page being left and keep it in the page cache."""
+        entry = tab.history.current
+        entry.scroll = tab.scroll
+        if tab.loaded and not tab.loading:
+            self.page_cache.put(entry, tab.snapshot())
+
+    def go(self, step):
+        tab = self.tab
+        if tab is None or not tab.history.can_go(step):
+            return
+        self.save_page(tab)
+        self.stop_load(tab)
+        entry = tab.history.go(step)
+        tab.url = entry.url
+        tab.scroll = entry.scroll
+        page = self.page_cache.take(entry)
+        if page is not None:
+            # Instant: no fetch, parse or layout. activate() reflows the
+            # cached layout if the window width changed since.
+            tab.restore(page)
+        else:
+            tab.discard()
+        self.activate(tab)
+
+    def go_back(self, event=None):
+        self.go(-1)
+
+    def go_forward(self, event=None):
+        self.go(1)
+
+    def new_tab(self, url):
+        tab = Tab(url)
+        self.tabs.append(tab)
+        self.activate(tab)
+
+    def activate(self, tab):
+        self.tab = tab
+        self.activations += 1
+        tab.last_active = self.activations
+        self.pending_scroll = 0
+        self.window.title(f"[{self.tabs.index(tab) + 1}/{len(self.tabs)}] {tab.url.get_url_without_view_source()}")
+        if tab.loaded:
+            width = self.canvas.winfo_width()
+            if tab.width != width and tab.steps is None:
+                # The window was resized while the tab (or cached page) was hidden.
+                tab.display_list = self.relayout(tab, width)
+            self.show(tab, tab.display_list)
+        else:
+            self.renderer.set_display_list(None)
+            if not tab.loading:
+                # New, or discarded under memory pressure: load it (again).
+                self.start_load(tab)
+
+    def next_tab(self, event=None):
+        if self.tabs:
+            self.activate(self.tabs[(self.tabs.index(self.tab) + 1) % len(self.tabs)])
+
+    def previous_tab(self, event=None):
+        if self.tabs:
+            self.activate(self.tabs[(self.tabs.index(self.tab) - 1) % len(self.tabs)])
+
+    def close_tab(self, event=None):
+        if len(self.tabs) <= 1:
+            return
+        tab = self.tab
+        index = self.tabs.index(tab)
+        self.stop_load(tab)
+        self.page_cache.drop(tab.history.entries)
+        self.tabs.remove(tab)
+        self.activate(self.tabs[min(index, len(self.tabs) - 1)])
+
+    def enforce_memory_budget(self):
+        """
+        Trim caches over their soft limits, then discard least recently
+        shown background tabs while over the memory budget.
+        """
+        enforce_limits(self.memory_limits, self.page_cache, self.layout_cache)
+        shared = shared_cache_bytes() + self.page_cache.bytes + self.layout_cache.bytes
+        for tab in tabs_to_discard(self.tabs, self.tab, self.memory_budget, shared):
+            tab.discard()
+
+    def memory_report(self):
+        """Bytes per structure across every tab and shared cache; see memory.memory_report."""
+        return memory_report(self.tabs, self.page_cache, self.layout_cache)
+
+    def stop_load(self, tab):
+        if tab.loader is not None:
+            tab.loader.cancel()
+            tab.loader = None
+        if tab.load_job is not None:
+            self.window.after_cancel(tab.load_job)
+            tab.load_job = None
+        tab.steps = None
+
+    def start_load(self, tab):
+        # Fetching, parsing and styling happen on a worker thread; the Tk
+        # event loop picks up each stage in poll_load().
+        self.stop_load(tab)
+        tab.timings = {}
+        tab.loader = PageLoader(tab.url).start()
+        tab.load_started = tab.loader.started
+        tab.load_job = self.window.after(POLL_INTERVAL, self.poll_load, tab)
+
+    def poll_load(self, tab):
+        tab.load_job = None
+        for stage, value, elapsed in tab.loader.poll():
+            tab.timings[stage] = elapsed
+            if stage == "error":
+                print("Failed to load page:", value)
+                tab.loader = None
                 return
-            else:
-                self.canvas.create_text(x, y - self.scroll, text=txt, anchor="nw", font=font)
+            if stage == "body" and tab.url.view_source:
+                # Lay out the highlighted source directly; there is no tree to build.
+                tab.nodes = None
+                tab.source = value
+                tab.layout = None
+                tab.content = tab.loader.content
+                tab.loader = None
+                self.show(tab, self.relayout(tab, self.canvas.winfo_width()))
+                self.finish_load(tab)
+                return
+            if stage == "tree":
+                tab.source = None
+                tab.nodes = value
+                tab.content = tab.loader.content
+                tab.loader = None
+                width = self.canvas.winfo_width()
+                cached = self.layout_cache.get(tab.content, width, TK_METRICS)
+                if cached is not None:
+                    # Same document, width and fonts as an earlier layout: skip layout.
+                    tab.layout = None
+                    tab.width = width
+                    tab.timings["first_paint"] = time.perf_counter() - tab.load_started
+                    self.show(tab, cached)
+                    self.finish_load(tab)
+                    return
+                # Build the boxes a slice at a time on this thread, painting as we go.
+                tab.layout = Layout(tab.nodes, width, defer=True)
+                tab.width = width
+                tab.steps = tab.layout.build_steps()
+                tab.painted_at = None
+                self.stream_layout(tab)
+                return
+        tab.load_job = self.window.after(POLL_INTERVAL, self.poll_load, tab)
+
+    def stream_layout(self, tab):
+        tab.load_job = None
+        deadline = time.perf_counter() + STREAM_SLICE
+        done = True
+        with span("Layout.build_steps", "layout"), track_stage("layout"):
+            for _ in tab.steps:
+                if time.perf_counter() >= deadline:
+                    done = False
+                    break
+        now = time.perf_counter()
+        # Paint the first screenful as soon as it exists, then extend the
+        # page (and its scrollbar) every STREAM_PAINT_INTERVAL seconds. Only
+        # the boxes added since the last paint are laid out and appended.
+        if done or tab.painted_at is None or now - tab.painted_at >= STREAM_PAINT_INTERVAL:
+            tab.width = self.canvas.winfo_width()
+            with span("Layout.reflow_tail", "layout", width=tab.width):
+                display_list = tab.layout.reflow_tail(tab.width)
+            if done or tab.painted_at is not None or display_list.height >= self.canvas.winfo_height():
+                if tab.painted_at is None:
+                    tab.timings["first_paint"] = now - tab.load_started
+                tab.painted_at = now
+                self.show(tab, display_list)
+        if done:
+            tab.steps = None
+            self.layout_cache.put(tab.content, tab.width, TK_METRICS, tab.display_list)
+            tab.timings["done"] = time.perf_counter() - tab.load_started
+            self.finish_load(tab)
+        else:
+            tab.load_job = self.window.after(1, self.stream_layout, tab)
+
+    def relayout(self, tab, width):
+        """
+        The tab's display list at width: from the layout cache when this
+        document was laid out at this width before, otherwise by reflowing
+        (building the Layout first if the page came from the cache).
+        """
+        tab.width = width
+        display_list = self.layout_cache.get(tab.content, width, TK_METRICS)
+        if display_list is None:
+            if tab.layout is None:
+                with span("Layout", "layout", width=width), track_stage("layout"):
+                    tab.layout = tab.make_layout(width)
+            with span("Layout.reflow", "layout", width=width):
+                display_list = tab.layout.reflow(width)
+            self.layout_cache.put(tab.content, width, TK_METRICS, display_list)
+        return display_list
+
+    def finish_load(self, tab):
+        tab.measure_memory()
+        self.enforce_memory_budget()
 
-        # (Optional) Draw a scrollbar if needed...
+    def show(self, tab, display_list):
+        tab.display_list = display_list
+        # Background tabs keep loading; they are drawn when activated.
+        if tab is self.tab:
+            # A list that only grew keeps the canvas items already drawn from it.
+            if display_list is not self.renderer.display_list:
+                self.renderer.set_display_list(display_list)
+            self.draw()
+
+    def draw(self):
+        tab = self.tab
         visible_height = self.canvas.winfo_height()
-        max_y = max((y for (x, y, txt, font, is_emoji) in self.display_list), default=0)
-        max_scroll = max(0, max_y - visible_height)
-        if self.scroll > max_scroll:
-            self.scroll = max_scroll
-        if max_y > visible_height:
-            scrollbar_width = 10
-            thumb_height = visible_height * (visible_height / max_y)
-            thumb_height = max(thumb_height, 20)
-            thumb_y = (self.scroll / max_scroll) * (visible_height - thumb_height) if max_scroll > 0 else 0
-            x0 = self.canvas.winfo_width() - scrollbar_width
-            y0 = thumb_y
-            x1 = self.canvas.winfo_width()
-            y1 = thumb_y + thumb_height
-            self.canvas.create_rectangle(x0, y0, x1, y1, fill="blue")
+        max_scroll = max(0, tab.display_list.height - visible_height)
+        # Don't clamp a page that is still growing; its saved position may not exist yet.
+        if tab.scroll > max_scroll and not tab.loading:
+            tab.scroll = max_scroll
+        # The renderer keeps the items it drew last frame and only creates or
+        # deletes the entries entering or leaving the viewport plus overscan.
+        with span("Browser.draw", "draw", scroll=tab.scroll):
+            self.renderer.render(min(tab.scroll, max_scroll), self.canvas.winfo_width(), visible_height)
+
+    def scroll_by(self, delta):
+        # Input only accumulates the scroll delta; the scheduler draws once
+        # per frame however many events arrive in between.
+        self.pending_scroll += delta
+        self.frames.request()
+
+    def frame(self):
+        tab = self.tab
+        if tab is None:
+            return
+        with span("frame", "input", delta=self.pending_scroll):
+            tab.scroll = max(0, tab.scroll + self.pending_scroll)
+            self.pending_scroll = 0
+            if tab.display_list is not None:
+                self.draw()
 
     def scrolldown(self, event):
-        self.scroll += SCROLL_STEP
-        self.draw()
+        self.scroll_by(SCROLL_STEP)
 
     def scrollup(self, event):
-        self.scroll -= SCROLL_STEP
-        if self.scroll < 0:
-            self.scroll = 0
-        self.draw()
+        self.scroll_by(-SCROLL_STEP)
 
     def on_mousewheel(self, event):
-        scroll_amount = - (event.delta / 120) * SCROLL_STEP
-        self.scroll += scroll_amount
-        if self.scroll < 0:
-            self.scroll = 0
-        self.draw()
+        self.scroll_by(- (event.delta / 120) * SCROLL_STEP)
 
     def on_mousewheel_up(self, event):
-        self.scroll -= SCROLL_STEP
-        if self.scroll < 0:
-            self.scroll = 0
-        self.draw()
+        self.scroll_by(-SCROLL_STEP)
 
     def on_mousewheel_down(self, event):
-        self.scroll += SCROLL_STEP
-        self.draw()
+        self.scroll_by(SCROLL_STEP)
 
     def on_configure(self, event):
-        new_width = event.width
-        if self.nodes:
-            self.display_list = Layout(self.nodes, new_width).display_list
+        # A window drag fires many <Configure> events; only the last one
+        # within RESIZE_DELAY ms triggers a relayout.
+        self.pending_width = event.width
+        if self.resize_job is not None:
+            self.window.after_cancel(self.resize_job)
+        self.resize_job = self.window.after(RESIZE_DELAY, self.apply_resize)
+
+    def apply_resize(self):
+        self.resize_job = None
+        tab = self.tab
+        if tab is None or not tab.loaded:
+            return
+        if self.pending_width != tab.width:
+            # Reuse the measured runs and only redo line breaking (or skip it, if
+            # this width is in the layout cache). Background tabs are reflowed
+            # when they are activated.
+            if tab.steps is not None:
+                with span("Layout.reflow", "layout", width=self.pending_width):
+                    tab.display_list = tab.layout.reflow(self.pending_width)
+                tab.width = self.pending_width
+            else:
+                tab.display_list = self.relayout(tab, self.pending_width)
+            self.renderer.set_display_list(tab.display_list)
+        if tab.display_list is not None:
             self.draw()
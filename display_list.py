@@ -0,0 +1,95 @@
+# display_list.py
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class DisplayList:
+    """
+    Compact display list: parallel columns sorted by y instead of a list of
+    (x, y, text, font, is_emoji, color) tuples. Fonts and colors are interned
+    into small tables and referenced by index. visible() finds the entries in
+    a y range by binary search, so drawing cost follows what is on screen
+    rather than the length of the document.
+    Iterating or indexing still yields the familiar 6-tuples.
+    """
+
+    def __init__(self, entries=()):
+        self.xs = array("i")
+        self.ys = array("i")
+        self.texts = []
+        self.font_ids = array("I")
+        self.color_ids = array("I")
+        self.emoji = bytearray()
+        self.fonts = []  # Interned font objects
+        self.colors = []  # Interned color names
+        self.font_index = {}  # id(font) -> index into fonts; Tk fonts are not hashable
+        self.color_index = {}
+        self.extend(entries)
+
+    def extend(self, entries):
+        """Add entries that all lie at or below the current height."""
+        # Sort by y (stable, so words on a line keep their order).
+        for x, y, text, font, is_emoji, color in sorted(entries, key=lambda entry: entry[1]):
+            self.append(x, y, text, font, is_emoji, color)
+
+    def append(self, x, y, text, font, is_emoji, color):
+        """Add an entry; callers must append in y order."""
+        font_id = self.font_index.get(id(font))
+        if font_id is None:
+            font_id = self.font_index[id(font)] = len(self.fonts)
+            self.fonts.append(font)
+        color_id = self.color_index.get(color)
+        if color_id is None:
+            color_id = self.color_index[color] = len(self.colors)
+            self.colors.append(color)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.texts.append(text)
+        self.font_ids.append(font_id)
+        self.color_ids.append(color_id)
+        self.emoji.append(1 if is_emoji else 0)
+
+    @property
+    def height(self):
+        """Largest y in the list (entries are sorted, so it is the last one)."""
+        return self.ys[-1] if self.ys else 0
+
+    def entry(self, i):
+        return (self.xs[i], self.ys[i], self.texts[i], self.fonts[self.font_ids[i]],
+                bool(self.emoji[i]), self.colors[self.color_ids[i]])
+
+    def index_range(self, y0, y1):
+        """Indices of the entries with y0 <= y <= y1."""
+        return range(bisect_left(self.ys, y0), bisect_right(self.ys, y1))
+
+    def visible(self, y0, y1):
+        """Yield the entries with y0 <= y <= y1."""
+        for i in self.index_range(y0, y1):
+            yield self.entry(i)
+
+    def nbytes(self):
+        """Approximate memory held by the columns; the word strings themselves are shared."""
+        return sum(sys.getsizeof(column) for column in
+                   (self.xs, self.ys, self.texts, self.font_ids, self.color_ids, self.emoji))
+
+    def __len__(self):
+        return len(self.ys)
+
+    def __iter__(self):
+        for i in range(len(self.ys)):
+            yield self.entry(i)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.entry(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("display list index out of range")
+        return self.entry(i)
+
+    def __eq__(self, other):
+        if not isinstance(other, (DisplayList, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
@@ -0,0 +1,254 @@
+# font_metrics.py
+import hashlib
+import json
+import math
+import unicodedata
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class FontInfo(NamedTuple):
+    font: object
+    label: object
+    ascent: int
+    descent: int
+    linespace: int
+
+
+class MeasureCache:
+    """
+    Size-bounded LRU cache of text widths keyed by (font key, text).
+    A font key is the (size, weight, style, family) tuple used by Layout.
+    Space widths are kept separately, one per font, and never evicted.
+    """
+
+    def __init__(self, backend, max_entries=200_000):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.widths = OrderedDict()
+        self.space_widths = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def measure(self, key, text):
+        entry = (key, text)
+        w = self.widths.get(entry)
+        if w is not None:
+            self.hits += 1
+            self.widths.move_to_end(entry)
+            return w
+        self.misses += 1
+        w = self.backend.measure_text(key, text)
+        self.widths[entry] = w
+        if len(self.widths) > self.max_entries:
+            self.widths.popitem(last=False)
+            self.evictions += 1
+        return w
+
+    def space_width(self, key):
+        w = self.space_widths.get(key)
+        if w is None:
+            w = self.space_widths[key] = self.backend.measure_text(key, " ")
+        return w
+
+    def premeasure(self, key, words):
+        """Measure every distinct word not already cached, in one batch."""
+        missing = [word for word in set(words) if (key, word) not in self.widths]
+        for word, w in zip(missing, self.backend.measure_many(key, missing)):
+            self.widths[(key, word)] = w
+        self.trim(self.max_entries)
+
+    def trim(self, max_entries):
+        """Evict least recently used widths until at most max_entries remain."""
+        while len(self.widths) > max_entries:
+            self.widths.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.widths),
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        self.widths.clear()
+        self.space_widths.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+class FontMetrics:
+    """
+    Interface between Layout and a source of font measurements.
+    Backends implement create_info() and measure_text(); the font registry
+    and the measurement cache are shared code so every backend gets them.
+    """
+    name = "base"
+
+    def __init__(self, max_entries=200_000):
+        self.fonts = {}  # font key -> FontInfo
+        self.cache = MeasureCache(self, max_entries)
+
+    def create_info(self, size, weight, style, family):
+        raise NotImplementedError
+
+    def measure_text(self, key, text):
+        raise NotImplementedError
+
+    def measure_many(self, key, texts):
+        return [self.measure_text(key, text) for text in texts]
+
+    def fingerprint(self):
+        """
+        A string that changes whenever measurements could change (different
+        fonts, tables or scaling), so cached layouts are never reused across
+        font configurations.
+        """
+        raise NotImplementedError
+
+    def info(self, key):
+        """Return the FontInfo for a font key, creating it once."""
+        info = self.fonts.get(key)
+        if info is None:
+            info = self.fonts[key] = self.create_info(*key)
+        return info
+
+    def measure(self, key, text):
+        return self.cache.measure(key, text)
+
+    def space_width(self, key):
+        return self.cache.space_width(key)
+
+    def premeasure(self, key, words):
+        self.cache.premeasure(key, words)
+
+
+class TkFontMetrics(FontMetrics):
+    """Measures with real Tk fonts. Needs a display; tkinter is imported on first use."""
+    name = "tk"
+
+    def create_info(self, size, weight, style, family):
+        import tkinter
+        import tkinter.font
+        # Create the font
+        if family:
+            font = tkinter.font.Font(family=family, size=size, weight=weight, slant=style)
+        else:
+            font = tkinter.font.Font(size=size, weight=weight, slant=style)
+        # Create a label so that measuring is cached more effectively
+        label = tkinter.Label(font=font)
+        # Metrics never change for a font, so query Tk for them only once.
+        metrics = font.metrics()
+        return FontInfo(font, label, metrics["ascent"], metrics["descent"], metrics["linespace"])
+
+    def measure_text(self, key, text):
+        return self.info(key).font.measure(text)
+
+    def fingerprint(self):
+        # What Tk actually resolved the default fonts to, plus the display scaling.
+        font = self.info((12, "normal", "roman", None)).font
+        bold = self.info((12, "bold", "roman", None)).font
+        scaling = font._root().call("tk", "scaling")
+        description = repr((sorted(font.actual().items()), sorted(bold.actual().items()),
+                            font.measure("abcdefghijklmnopqrstuvwxyz"), scaling))
+        return self.name + ":" + hashlib.blake2b(description.encode("utf-8"), digest_size=8).hexdigest()
+
+
+# Advance widths in 1/1000 em for printable ASCII (32-126), from the
+# standard Helvetica and Helvetica-Bold font metrics.
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+DEFAULT_TABLES = {
+    "normal": {
+        "widths": {chr(32 + i): w for i, w in enumerate(HELVETICA_WIDTHS)},
+        "default": 556,
+    },
+    "bold": {
+        "widths": {chr(32 + i): w for i, w in enumerate(HELVETICA_BOLD_WIDTHS)},
+        "default": 611,
+    },
+    "monospace": {"widths": {}, "default": 600},
+    "ascent": 0.905,
+    "descent": 0.212,
+}
+MONOSPACE_FAMILIES = {"courier", "courier new", "monospace", "tkfixedfont"}
+
+
+class HeadlessFontMetrics(FontMetrics):
+    """
+    Pure-Python metrics from width tables, so layout runs without a display.
+    Results are deterministic across machines. Sizes are points, converted to
+    pixels at Tk's usual 96 dpi scaling. Italic shares the upright widths, and
+    East Asian wide characters take a full em.
+    The font object stored for each key is a Tk font description tuple, so a
+    headless display list can still be drawn on a canvas.
+    """
+    name = "headless"
+    PIXELS_PER_POINT = 96 / 72
+
+    def __init__(self, tables=None, max_entries=200_000):
+        super().__init__(max_entries)
+        self.tables = tables or DEFAULT_TABLES
+
+    @classmethod
+    def from_file(cls, path, max_entries=200_000):
+        """Load width tables from a JSON metrics file shaped like DEFAULT_TABLES."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), max_entries)
+
+    def __reduce__(self):
+        # Pickle just the tables (e.g. for worker processes), not the caches.
+        return (type(self), (self.tables, self.cache.max_entries))
+
+    def fingerprint(self):
+        tables = json.dumps(self.tables, sort_keys=True)
+        return self.name + ":" + hashlib.blake2b(tables.encode("utf-8"), digest_size=8).hexdigest()
+
+    def table(self, weight, family):
+        if family and family.lower() in MONOSPACE_FAMILIES:
+            return self.tables["monospace"]
+        return self.tables["bold" if weight == "bold" else "normal"]
+
+    def create_info(self, size, weight, style, family):
+        px = size * self.PIXELS_PER_POINT
+        ascent = math.ceil(px * self.tables["ascent"])
+        descent = math.ceil(px * self.tables["descent"])
+        options = " ".join(opt for opt in (weight if weight == "bold" else "",
+                                           "italic" if style == "italic" else "") if opt)
+        font = (family or "Helvetica", size, options) if options else (family or "Helvetica", size)
+        return FontInfo(font, None, ascent, descent, ascent + descent)
+
+    def measure_text(self, key, text):
+        size, weight, style, family = key
+        table = self.table(weight, family)
+        widths = table["widths"]
+        default = table["default"]
+        units = 0
+        for c in text:
+            w = widths.get(c)
+            if w is None:
+                w = 1000 if unicodedata.east_asian_width(c) in "WF" else default
+            units += w
+        return round(units * size * self.PIXELS_PER_POINT / 1000)
+
+
+# The backend Layout uses when none is given.
+TK_METRICS = TkFontMetrics()
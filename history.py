@@ -0,0 +1,120 @@
+# history.py
+from collections import OrderedDict
+from typing import NamedTuple
+
+# Default bounds of the back/forward cache, shared by all tabs.
+MAX_CACHED_PAGES = 8
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+
+class HistoryEntry:
+    """One visited page in a tab's session history."""
+
+    def __init__(self, url):
+        self.url = url
+        self.scroll = 0  # Saved when the page is left, restored on back/forward
+
+    def __repr__(self):
+        return f"HistoryEntry({self.url.get_url_without_view_source()!r})"
+
+
+class History:
+    """A tab's back/forward list of entries, with the current position."""
+
+    def __init__(self, url):
+        self.entries = [HistoryEntry(url)]
+        self.index = 0
+
+    @property
+    def current(self):
+        return self.entries[self.index]
+
+    def visit(self, url):
+        """Add url after the current entry. Returns the forward entries this drops."""
+        dropped = self.entries[self.index + 1:]
+        del self.entries[self.index + 1:]
+        self.entries.append(HistoryEntry(url))
+        self.index += 1
+        return dropped
+
+    def can_go(self, step):
+        return 0 <= self.index + step < len(self.entries)
+
+    def go(self, step):
+        """Move step entries back (negative) or forward; returns the new entry or None."""
+        if not self.can_go(step):
+            return None
+        self.index += step
+        return self.current
+
+
+class CachedPage(NamedTuple):
+    """Everything needed to show a page again without fetching, parsing or layout."""
+    nodes: object
+    source: object
+    layout: object
+    display_list: object
+    content: object  # Content key, see layout_cache.content_key
+    width: int  # Width the display list was laid out for
+    memory: int  # Estimated bytes, see Tab.measure_memory
+
+
+class PageCache:
+    """
+    Back/forward cache: pages recently navigated away from, keyed by their
+    history entry. Bounded by page count and by estimated bytes; the least
+    recently stored page is evicted first. Taking a page removes it, since
+    it becomes a live document again.
+    """
+
+    def __init__(self, max_pages=MAX_CACHED_PAGES, max_bytes=MAX_CACHED_BYTES):
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.pages = OrderedDict()  # HistoryEntry -> CachedPage
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, entry, page):
+        self.drop([entry])
+        if page.memory > self.max_bytes:
+            return
+        self.pages[entry] = page
+        self.bytes += page.memory
+        while len(self.pages) > self.max_pages or self.bytes > self.max_bytes:
+            old_entry, old_page = self.pages.popitem(last=False)
+            self.bytes -= old_page.memory
+            self.evictions += 1
+
+    def take(self, entry):
+        page = self.pages.pop(entry, None)
+        if page is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bytes -= page.memory
+        return page
+
+    def trim(self, max_bytes):
+        """Evict the oldest pages until the cache holds at most max_bytes."""
+        while self.pages and self.bytes > max_bytes:
+            old_entry, old_page = self.pages.popitem(last=False)
+            self.bytes -= old_page.memory
+            self.evictions += 1
+
+    def drop(self, entries):
+        """Forget the pages of entries that can no longer be navigated to."""
+        for entry in entries:
+            page = self.pages.pop(entry, None)
+            if page is not None:
+                self.bytes -= page.memory
+
+    def stats(self):
+        return {
+            "pages": len(self.pages),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,4 +1,5 @@
 # html_parser.py
+import sys
 
 class Text:
     def __init__(self, text, parent):
@@ -6,6 +7,17 @@ class Text:
         self.children = []  # Even though text nodes don't have children.
         self.parent = parent
 
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+        # Whitespace tokenization happens once, here, instead of on every layout.
+        # Interning makes repeated words share one string object.
+        self.words = tuple(sys.intern(word) for word in value.split())
+
     def __repr__(self):
         return repr(self.text)
 
@@ -305,7 +317,10 @@ def print_tree(node, indent=0):
 
 # Example test (assuming URL module is available):
 if __name__ == "__main__":
-    import sys
+    # Batch mode: python html_parser.py --batch <dirs|globs|urls|@list> [options]
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        from batch import main
+        sys.exit(main(sys.argv[2:]))
     from url import URL  # Adjust the import path as needed.
     # Retrieve the HTML source code from a given URL or file.
     body = URL(sys.argv[1]).request() if len(sys.argv) > 1 else ""
@@ -1,8 +1,25 @@
 # layout.py
-import tkinter
-import tkinter.font
 import math
+from bisect import bisect_right
+from itertools import chain, repeat
 from typing import Literal
+from font_metrics import TK_METRICS
+from display_list import DisplayList
+from style import DEFAULT_STYLE, compute_styles
+
+# NumPy takes longer to import than most pages take to lay out, so it is
+# loaded on first use by load_numpy(); None means pure-Python line breaking.
+numpy = None
+numpy_checked = False
+
+def load_numpy():
+    global numpy, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy
+        except ImportError:  # Line breaking falls back to pure Python.
+            numpy = None
 
 # Global constants.
 WIDTH = 800
@@ -15,17 +32,15 @@ WeightType = Literal["normal", "bold"]
 StyleType = Literal["roman", "italic"]
 
 
-FONTS = {}
+# Font registry and measurement cache of the default Tk backend.
+FONTS = TK_METRICS.fonts
+MEASURE_CACHE = TK_METRICS.cache
+
+def font_info(size, weight, style, family=None):
+    return TK_METRICS.info((size, weight, style, family))
 
-def get_font(size, weight, style):
-    key = (size, weight, style)
-    if key not in FONTS:
-        # Create the font
-        font = tkinter.font.Font(size=size, weight=weight, slant=style)
-        # Create a label so that measuring is cached more effectively
-        label = tkinter.Label(font=font)
-        FONTS[key] = (font, label)
-    return FONTS[key][0]
+def get_font(size, weight, style, family=None):
+    return font_info(size, weight, style, family).font
 
 # Text and Tag classes for tokenizing the HTML content.
 class Text:
@@ -172,110 +187,512 @@ def lex(body):
 
 
 
-class Layout:
-    def __init__(self, root, width=WIDTH):
-        self.display_list = []  # List of tuples: (x, y, text, font, is_emoji)
-        self.line = []  # Current line buffer
+# Elements that start on a new line and get their own BlockBox.
+BLOCK_ELEMENTS = {
+    "html", "body", "article", "section", "nav", "aside",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hgroup", "header",
+    "footer", "address", "p", "hr", "pre", "blockquote",
+    "ol", "ul", "menu", "li", "dl", "dt", "dd", "figure",
+    "figcaption", "main", "div", "table", "form", "fieldset",
+    "legend", "details", "summary",
+}
+
 
-        # Font styling state
-        self.weight = "normal"
-        self.style = "roman"
-        self.size = 12
+class Run:
+    """
+    A stretch of measured inline content between two forced line breaks.
+    Words are stored as parallel columns (text, font key, color, width and
+    the space after it), so breaking a run into lines needs no DOM walk and
+    no text measurement.
+    """
 
-        # Cursor state
-        self.cursor_x = HSTEP
-        self.cursor_y = VSTEP
+    def __init__(self, center=False):
+        self.center = center
+        self.texts = []
+        self.keys = []
+        self.colors = []
+        self.widths = []
+        self.spaces = []
+        self.indent = 0  # Extra x offset for the run's first line.
+        self.blank_key = None  # Font key of an empty run that still takes a line.
+        self.columns = None  # Derived line-breaking columns, see prepare()
 
-        self.center_mode = False
-        self.width = width
+    def add(self, text, key, color, w, space_w):
+        self.texts.append(text)
+        self.keys.append(key)
+        self.colors.append(color)
+        self.widths.append(w)
+        self.spaces.append(space_w)
 
-        # Recursively walk the node tree
-        self.recurse(root)
-        self.flush()
-
-    def open_tag(self, tag):
-        # Example handling for some tags:
-        if tag == "i":
-            self.style = "italic"
-        elif tag == "b":
-            self.weight = "bold"
-        elif tag == "small":
-            self.size -= 2
-        elif tag == "big":
-            self.size += 4
-        elif tag.startswith("h1"):
-            self.flush()          # Flush current line before heading changes layout
-            self.center_mode = True
-        # ... add additional tag handling as needed
-
-    def close_tag(self, tag):
-        if tag == "i":
-            self.style = "roman"
-        elif tag == "b":
-            self.weight = "normal"
-        elif tag == "small":
-            self.size += 2
-        elif tag == "big":
-            self.size -= 4
-        elif tag.startswith("h1"):
-            self.flush()
-            self.center_mode = False
-        # ... add additional tag handling as needed
-
-    def recurse(self, node):
-        # We assume that text nodes are instances of Text (from html_parser) and
-        # element nodes are instances of Element.
-        from html_parser import Text  # Importing our node classes.
-        if isinstance(node, Text):
-            # Process text node: split text into words and layout each word.
-            for word in node.text.split():
-                self.word(word)
+    def __len__(self):
+        return len(self.texts)
+
+    def extent(self):
+        """Rightmost x the run reaches when laid out on a single line."""
+        x = HSTEP + self.indent
+        right = x
+        last = len(self.widths) - 1
+        for i, (w, space_w) in enumerate(zip(self.widths, self.spaces)):
+            x += w
+            # A trailing space only forces a break if more words follow.
+            right = max(right, x + space_w if i < last else x)
+            x += space_w
+        return right
+
+    def prepare(self, metrics):
+        """
+        Compute the columns line breaking works on, once per run:
+          prefix[i]  x advance of everything before word i,
+          reach[i]   prefix[i + 1] + widths[i + 1], how far the line reaches
+                     if word i + 1 joins word i's line (non-decreasing),
+        plus per-word ascent, descent and font object.
+        """
+        if self.columns is not None:
+            return self.columns
+        load_numpy()
+        prefix = [0]
+        total = 0
+        for w, space_w in zip(self.widths, self.spaces):
+            total += w + space_w
+            prefix.append(total)
+        reach = [prefix[i + 1] + self.widths[i + 1] for i in range(len(self.widths) - 1)]
+        infos = {key: metrics.info(key) for key in set(self.keys)}
+        ascents = [infos[key].ascent for key in self.keys]
+        descents = [infos[key].descent for key in self.keys]
+        fonts = [infos[key].font for key in self.keys]
+        if numpy is not None:
+            prefix, reach = numpy.array(prefix, dtype=numpy.int64), numpy.array(reach, dtype=numpy.int64)
+            widths = numpy.array(self.widths, dtype=numpy.int64)
+            ascents = numpy.array(ascents, dtype=numpy.int64)
+            descents = numpy.array(descents, dtype=numpy.int64)
         else:
-            # For element nodes, treat the tag as an open tag,
-            # then recurse into its children, then call the close_tag.
-            self.open_tag(node.tag)
-            for child in node.children:
-                self.recurse(child)
-            self.close_tag(node.tag)
-
-    def word(self, word):
-        current_font = get_font(self.size, self.weight, self.style)
-        w = current_font.measure(word)
-        # If the word doesn't fit in the current line, flush the line.
-        if self.cursor_x + w > self.width - HSTEP:
-            self.flush()
-        # Append the word along with its x-coordinate and font.
-        self.line.append((self.cursor_x, word, current_font))
-        self.cursor_x += w
-        # Measure a space and add it.
-        space_w = current_font.measure(" ")
-        if self.cursor_x + space_w > self.width - HSTEP:
-            self.flush()
+            widths = self.widths
+        self.columns = (prefix, reach, widths, ascents, descents, fonts)
+        return self.columns
+
+
+def line_starts(run, width, reach, prefix):
+    """
+    Indices of the first word of every line, using the greedy rule: word i
+    ends its line when the next word would not fit after its space.
+    Because reach is non-decreasing, each line end is one binary search.
+    """
+    n = len(run)
+    starts = [0]
+    start = 0
+    room = width - 2 * HSTEP - run.indent
+    while True:
+        limit = int(prefix[start]) + room
+        if numpy is not None:
+            end = int(numpy.searchsorted(reach[start:], limit, side="right")) + start
         else:
-            self.cursor_x += space_w
+            end = bisect_right(reach, limit, start)
+        if end >= n - 1:
+            return starts
+        start = end + 1
+        starts.append(start)
+        room = width - 2 * HSTEP
+
+
+def place_words(run, width, cursor_y, starts, columns):
+    """
+    Return (x, y, next cursor_y) for every word of a run given its line starts.
+    The NumPy path does the whole run with cumulative sums; the pure-Python
+    path computes the same values line by line.
+    """
+    prefix, reach, widths, ascents, descents, fonts = columns
+    n = len(run)
+    ends = starts[1:] + [n]
+    if numpy is not None:
+        starts_a = numpy.array(starts)
+        ends_a = numpy.array(ends)
+        line_of = numpy.repeat(numpy.arange(len(starts)), ends_a - starts_a)
+        xs = HSTEP + prefix[:-1] - prefix[starts_a][line_of]
+        xs[:ends[0]] += run.indent
+        if run.center:
+            total = xs[ends_a - 1] + widths[ends_a - 1] - HSTEP
+            xs += ((width - total) // 2)[line_of]
+        max_ascent = (1.25 * numpy.maximum.reduceat(ascents, starts_a)).astype(numpy.int64)
+        max_descent = (1.25 * numpy.maximum.reduceat(descents, starts_a)).astype(numpy.int64)
+        line_heights = max_ascent + max_descent
+        tops = cursor_y + numpy.concatenate(([0], numpy.cumsum(line_heights)[:-1]))
+        ys = (tops + max_ascent)[line_of] - ascents
+        return xs.tolist(), ys.tolist(), cursor_y + int(line_heights.sum())
+    xs = []
+    ys = []
+    for line, (start, end) in enumerate(zip(starts, ends)):
+        x0 = HSTEP - prefix[start] + (run.indent if line == 0 else 0)
+        if run.center:
+            total = x0 + prefix[end - 1] + widths[end - 1] - HSTEP
+            x0 += (width - total) // 2
+        xs.extend(x0 + prefix[i] for i in range(start, end))
+        # Line metrics come from the tallest fonts on the line.
+        baseline = cursor_y + int(1.25 * max(ascents[start:end]))
+        ys.extend(baseline - ascents[i] for i in range(start, end))
+        cursor_y = baseline + int(1.25 * max(descents[start:end]))
+    return xs, ys, cursor_y
+
+
+def break_lines(runs, width, metrics):
+    """
+    Break measured runs into lines for a width. Returns (xs, ys, fonts,
+    height): the x, y (relative to the top of the runs) and font of every
+    word, in the runs' order, and the height of the lines.
+    """
+    xs = []
+    ys = []
+    fonts = []
+    cursor_y = 0
+    for run in runs:
+        if not run.texts:
+            # Empty runs (blank source lines) still advance by one line.
+            cursor_y += int(1.25 * metrics.info(run.blank_key).linespace)
+            continue
+        columns = run.prepare(metrics)
+        starts = line_starts(run, width, columns[1], columns[0])
+        run_xs, run_ys, cursor_y = place_words(run, width, cursor_y, starts, columns)
+        xs.extend(run_xs)
+        ys.extend(run_ys)
+        fonts.extend(columns[5])
+    return xs, ys, fonts, cursor_y
+
+
+class InlineBox:
+    """
+    Anonymous box holding the measured runs of consecutive inline content.
+    Its lines are cached and reused when the width is unchanged, or when no
+    line wraps at either the old or the new width.
+    """
+
+    def __init__(self, runs):
+        self.runs = runs
+        self.y = 0  # Offset from the top of the parent box.
+        self.width = None
+        # Placed words as columns, in the runs' order; texts and colors stay in the runs.
+        self.xs = []
+        self.ys = []  # Relative to the top of this box
+        self.fonts = []
+        self.height = 0
+        self.centered = any(run.center for run in runs)
+        self.right = max(run.extent() for run in runs)
+
+    def unwrapped(self, width):
+        return not self.centered and self.right <= width - HSTEP
+
+    def layout(self, width, metrics):
+        if self.width is not None and (width == self.width or
+                                       (self.unwrapped(self.width) and self.unwrapped(width))):
+            self.width = width
+            return self.height
+        self.xs, self.ys, self.fonts, self.height = break_lines(self.runs, width, metrics)
+        self.width = width
+        return self.height
+
+    def paint(self, display_list, y):
+        display_list.extend(zip(self.xs, [y + dy for dy in self.ys],
+                                chain.from_iterable(run.texts for run in self.runs), self.fonts,
+                                repeat(False), chain.from_iterable(run.colors for run in self.runs)))
+
+
+class BlockBox:
+    """
+    Box for a block-level element (or the document root).
+    Children are BlockBoxes and InlineBoxes stacked vertically.
+    dirty means the box must be rebuilt from the DOM; layout_dirty means a
+    descendant changed and child offsets and height must be recomputed.
+    """
+
+    def __init__(self, node, parent):
+        self.node = node
+        self.parent = parent
+        self.children = []
+        self.y = 0  # Offset from the top of the parent box.
+        self.width = None
+        self.height = 0
+        self.dirty = True
+        self.layout_dirty = True
 
-    def flush(self):
-        if not self.line:
+    def mark_dirty(self):
+        self.dirty = True
+        box = self
+        while box is not None:
+            box.layout_dirty = True
+            box = box.parent
+
+    def layout(self, width, metrics):
+        if not self.layout_dirty and width == self.width:
+            return self.height
+        # Post-order walk with an explicit stack, so deep nesting is safe: a
+        # box is stacked again above its stale block children and stacks its
+        # children once they all have their heights.
+        stack = [(self, False)]
+        while stack:
+            box, ready = stack.pop()
+            if not ready:
+                stack.append((box, True))
+                stack.extend((child, False) for child in box.children if isinstance(child, BlockBox)
+                             and (child.layout_dirty or width != child.width))
+                continue
+            y = 0
+            for child in box.children:
+                child.y = y
+                y += child.height if isinstance(child, BlockBox) else child.layout(width, metrics)
+            box.height = y
+            box.width = width
+            box.layout_dirty = False
+        return self.height
+
+    def paint(self, display_list, y):
+        # Inline boxes are painted in document order, without recursing.
+        stack = [(self, y)]
+        while stack:
+            box, y = stack.pop()
+            if isinstance(box, BlockBox):
+                stack.extend((child, y + child.y) for child in reversed(box.children))
+            else:
+                box.paint(display_list, y)
+
+
+class Layout:
+    """
+    Builds a box tree mirroring the element tree and paints it into a
+    display list. Fonts, colors and alignment come from the computed
+    styles (see style.py). Text is measured once when boxes are built;
+    reflow() and update() only redo the parts whose width or content changed.
+    """
+
+    def __init__(self, root, width=WIDTH, metrics=None, workers=None, parent_style=None, defer=False):
+        """
+        workers: lay out independent blocks in up to that many processes,
+                 one per available CPU; with a single CPU the serial build
+                 is faster and is used (needs a headless metrics backend,
+                 see parallel_layout).
+        parent_style: computed style that root inherits from, when root is
+                      a subtree rather than a whole document.
+        defer: don't build anything yet; the caller drives build_steps()
+               and calls reflow() whenever it wants to paint.
+        """
+        # Font backend: real Tk fonts by default, or e.g. HeadlessFontMetrics.
+        self.metrics = metrics or TK_METRICS
+        self.width = width
+        self.display_list = DisplayList()  # Entries: (x, y, text, font, is_emoji, color)
+        self.boxes = {}  # Element node -> BlockBox, for mark_dirty()
+        self.paint_cursor = None  # Where reflow_tail() resumes painting
+        self.parent_style = parent_style or DEFAULT_STYLE
+
+        # Build the box tree, measuring text into runs.
+        self.root_box = BlockBox(root, None)
+        if defer:
             return
+        if workers:
+            from parallel_layout import available_cpus, build_parallel
+            workers = min(workers, available_cpus())
+        if workers and workers > 1:
+            compute_styles(root, self.parent_style)
+            build_parallel(self, workers)
+        else:
+            # Measure the document's body-text words up front in one batch.
+            self.premeasure(root)
+            self.build(self.root_box)
+        # Break the runs into lines for this width.
+        self.reflow(width)
+
+    def premeasure(self, root):
+        from html_parser import Text
+        words = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Text):
+                words.extend(node.words)
+            else:
+                stack.extend(node.children)
+        self.metrics.premeasure(self.parent_style.font_key, words)
+
+    def build(self, box):
+        """(Re)build a block box's children from its element."""
+        node = box.node
+        compute_styles(node, self.parent_style if box is self.root_box else node.parent.style)
+        # Forget the boxes of the old subtree before replacing them.
+        stack = list(box.children)
+        while stack:
+            child = stack.pop()
+            if isinstance(child, BlockBox):
+                self.boxes.pop(child.node, None)
+                stack.extend(child.children)
+        self.collect(box)
+
+    def collect(self, box):
+        """Fill a block box from its element, whose styles are already computed."""
+        self.enter_block(box)
+        self.walk([box] + [(child, box.node.style) for child in reversed(box.node.children)])
+
+    def enter_block(self, box):
+        self.boxes[box.node] = box
+        box.children = []
+        self.block = box
+        self.pending_runs = []
+        self.current = Run(box.node.style.align == "center")
+
+    def leave_block(self, box):
+        """Finish a block box and continue its parent's content on a new line."""
+        self.end_inline()
+        box.dirty = False
+        box.layout_dirty = True
+        parent = box.parent
+        if parent is not None:
+            self.block = parent
+            self.current = Run(parent.node.style.align == "center")
 
-        # If center mode is enabled, adjust each word's x-coordinate.
-        if self.center_mode:
-            total_width = max(x + font.measure(word) for (x, word, font) in self.line) - HSTEP
-            offset = (self.width - total_width) // 2
-            self.line = [(x + offset, word, font) for (x, word, font) in self.line]
-
-        # First pass: compute metrics for all words.
-        metrics = [font.metrics() for (x, word, font) in self.line]
-        max_ascent = max(m["ascent"] for m in metrics)
-        max_descent = max(m["descent"] for m in metrics)
-        # Compute baseline position.
-        baseline = self.cursor_y + int(1.25 * max_ascent)
-        # Second pass: assign y positions.
-        for (x, word, font) in self.line:
-            y = baseline - font.metrics("ascent")
-            self.display_list.append((x, y, word, font, False))
-        # Update cursor_y to move to the next line.
-        self.cursor_y = baseline + int(1.25 * max_descent)
-        # Reset horizontal cursor and clear the line buffer.
-        self.cursor_x = HSTEP
-        self.line = []
+    def build_steps(self):
+        """
+        Build the root box a piece at a time, yielding after each child node
+        of every block, so a caller can paint what exists and keep the UI
+        responsive. Styles must already be computed (see compute_styles).
+        The finished tree is the same as the one build() makes.
+        """
+        from html_parser import Element
+        root = self.root_box
+        self.enter_block(root)
+        # (node, block box it is a child of) or a BlockBox whose children are all done.
+        stack = [root] + [(child, root) for child in reversed(root.node.children)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, BlockBox):
+                self.leave_block(item)
+                box = item.parent
+                if box is None:
+                    return
+            else:
+                child, box = item
+                if isinstance(child, Element) and child.tag in BLOCK_ELEMENTS:
+                    self.end_inline()
+                    child_box = BlockBox(child, box)
+                    box.children.append(child_box)
+                    self.enter_block(child_box)
+                    stack.append(child_box)
+                    stack.extend((grandchild, child_box) for grandchild in reversed(child.children))
+                    continue
+                self.recurse(child, box.node.style)
+            # New children must be laid out by the next reflow(), even if
+            # this box and its ancestors were laid out since the last step.
+            ancestor = box
+            while ancestor is not None:
+                ancestor.layout_dirty = True
+                ancestor = ancestor.parent
+            yield
+
+    def start_run(self):
+        """Close the current run and begin a new one with the block's alignment."""
+        if self.current.texts or self.current.blank_key:
+            self.pending_runs.append(self.current)
+        self.current = Run(self.current.center)
+
+    def end_inline(self):
+        """Wrap the runs collected so far in an InlineBox of the current block."""
+        self.start_run()
+        if self.pending_runs:
+            self.block.children.append(InlineBox(self.pending_runs))
+            self.pending_runs = []
+
+    def recurse(self, node, style):
+        # style is the computed style of the element containing node.
+        self.walk([(node, style)])
+
+    def walk(self, stack):
+        """
+        Add the nodes on stack to the box tree, in document order. Entries are
+        (node, style of the element containing it), or a BlockBox whose content
+        is complete. An explicit stack instead of recursion keeps deeply nested
+        documents within reach.
+        """
+        from html_parser import Text  # Importing our node classes.
+        while stack:
+            item = stack.pop()
+            if isinstance(item, BlockBox):
+                self.leave_block(item)
+                continue
+            node, style = item
+            if isinstance(node, Text):
+                # Process text node: measure each of its pre-split words.
+                key = style.font_key
+                space_w = self.metrics.space_width(key)
+                add = self.current.add
+                for word in node.words:
+                    add(word, key, style.color, self.metrics.measure(key, word), space_w)
+            elif node.tag in BLOCK_ELEMENTS:
+                # Block elements get their own box, starting on a new line.
+                self.end_inline()
+                box = BlockBox(node, self.block)
+                self.block.children.append(box)
+                self.enter_block(box)
+                stack.append(box)
+                stack.extend((child, node.style) for child in reversed(node.children))
+            else:
+                # Inline elements just pass their own style down to their children.
+                stack.extend((child, node.style) for child in reversed(node.children))
+
+    def mark_dirty(self, node):
+        """Flag the block containing node for rebuilding; call update() afterwards."""
+        while node is not None and node not in self.boxes:
+            node = node.parent
+        box = self.boxes.get(node, self.root_box)
+        box.mark_dirty()
+
+    def update(self):
+        """Rebuild dirty blocks from the DOM and reflow at the current width."""
+        stack = [self.root_box]
+        while stack:
+            box = stack.pop()
+            if box.dirty:
+                self.build(box)
+            else:
+                stack.extend(child for child in box.children if isinstance(child, BlockBox))
+        return self.reflow(self.width)
+
+    def reflow(self, width):
+        """
+        Lay the box tree out at a width. Boxes whose lines are still valid
+        are only shifted to their new y offsets, so this is cheap enough to
+        run on every window resize.
+        """
+        self.width = width
+        self.root_box.layout(width, self.metrics)
+        entries = []
+        self.root_box.paint(entries, VSTEP)
+        self.display_list = DisplayList(entries)
+        self.paint_cursor = None
+        return self.display_list
+
+    def reflow_tail(self, width):
+        """
+        reflow() for a tree build_steps() is still growing: lay out at width
+        and append only the inline boxes added since the last call to the
+        display list, which stays the same object. New boxes only ever follow
+        the existing ones, so those keep their lines and places. After a
+        width change or a full reflow() the whole tree is painted again.
+        """
+        if self.paint_cursor is None or width != self.width:
+            self.display_list = DisplayList()
+            # [block box, its top, index of its next child to paint], root first.
+            self.paint_cursor = [[self.root_box, VSTEP, 0]]
+        self.width = width
+        self.root_box.layout(width, self.metrics)
+        entries = []
+        stack = self.paint_cursor
+        while stack:
+            frame = stack[-1]
+            box, y, i = frame
+            if i == len(box.children):
+                if box.dirty:
+                    break  # Still being built, so more children may follow
+                stack.pop()
+                continue
+            frame[2] = i + 1
+            child = box.children[i]
+            if isinstance(child, BlockBox):
+                stack.append([child, y + child.y, 0])
+            else:
+                child.paint(entries, y + child.y)
+        self.display_list.extend(entries)
+        return self.display_list
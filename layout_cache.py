@@ -0,0 +1,167 @@
+# layout_cache.py
+import hashlib
+import os
+import pickle
+import zlib
+from collections import OrderedDict
+
+from display_list import DisplayList
+
+# Bump when the on-disk format or layout output changes, so stale files are ignored.
+FORMAT_VERSION = 1
+
+MAX_ENTRIES = 32
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def content_key(source, kind="html"):
+    """Hash of a document's source text; kind separates e.g. view-source layouts of the same text."""
+    digest = hashlib.blake2b(source.encode("utf-8", errors="surrogatepass"), digest_size=16)
+    digest.update(kind.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def font_keys(display_list, metrics):
+    """
+    The font key of every font in display_list.fonts, found through the
+    metrics' registry: by identity first, then by value for equal copies,
+    such as fonts unpickled from another process. Tk fonts are not
+    hashable, so the fallback scans the (small) registry.
+    """
+    keys_by_font = {id(info.font): key for key, info in metrics.fonts.items()}
+    keys = []
+    for font in display_list.fonts:
+        key = keys_by_font.get(id(font))
+        if key is None:
+            key = next((key for key, info in metrics.fonts.items() if info.font == font), None)
+            if key is None:
+                raise ValueError(f"font {font!r} was not created by {metrics.name} metrics")
+        keys.append(key)
+    return keys
+
+
+def dump(display_list, metrics):
+    """
+    Compact bytes for a display list: its columns, font keys and colors,
+    zlib-compressed. metrics must be the backend that laid the list out.
+    """
+    columns = (FORMAT_VERSION, display_list.xs.tobytes(), display_list.ys.tobytes(),
+               display_list.texts, display_list.font_ids.tobytes(),
+               display_list.color_ids.tobytes(), bytes(display_list.emoji),
+               font_keys(display_list, metrics), display_list.colors)
+    return zlib.compress(pickle.dumps(columns, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def load(data, metrics):
+    """Rebuild a display list written by dump(), with fonts from metrics."""
+    version, xs, ys, texts, font_ids, color_ids, emoji, keys, colors = pickle.loads(zlib.decompress(data))
+    if version != FORMAT_VERSION:
+        return None
+    display_list = DisplayList()
+    display_list.xs.frombytes(xs)
+    display_list.ys.frombytes(ys)
+    display_list.texts = texts
+    display_list.font_ids.frombytes(font_ids)
+    display_list.color_ids.frombytes(color_ids)
+    display_list.emoji = bytearray(emoji)
+    display_list.fonts = [metrics.info(key).font for key in keys]
+    display_list.font_index = {id(font): i for i, font in enumerate(display_list.fonts)}
+    display_list.colors = colors
+    display_list.color_index = {color: i for i, color in enumerate(colors)}
+    return display_list
+
+
+class LayoutCache:
+    """
+    Bounded LRU cache of finished display lists keyed by (document content
+    hash, width, font fingerprint). With a directory, every stored list is
+    also written there in dump() form and looked up on a memory miss, so
+    later processes (e.g. batch renders of unchanged documents) skip layout.
+    Cached display lists are shared and must not be modified.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, directory=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()  # key -> DisplayList
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, content, width, metrics):
+        return (content, width, metrics.fingerprint())
+
+    def path(self, key):
+        name = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + ".layout")
+
+    def get(self, content, width, metrics):
+        key = self.key(content, width, metrics)
+        display_list = self.entries.get(key)
+        if display_list is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return display_list
+        if self.directory:
+            try:
+                with open(self.path(key), "rb") as f:
+                    display_list = load(f.read(), metrics)
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError, zlib.error):
+                display_list = None
+            if display_list is not None:
+                self.disk_hits += 1
+                self.remember(key, display_list)
+                return display_list
+        self.misses += 1
+        return None
+
+    def put(self, content, width, metrics, display_list):
+        key = self.key(content, width, metrics)
+        self.remember(key, display_list)
+        if self.directory:
+            # Write to a temporary name first, so readers never see half a file.
+            path = self.path(key)
+            try:
+                with open(path + ".tmp", "wb") as f:
+                    f.write(dump(display_list, metrics))
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                print("Could not write layout cache file:", e)
+
+    def remember(self, key, display_list):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old.nbytes()
+        size = display_list.nbytes()
+        if size > self.max_bytes:
+            return
+        self.entries[key] = display_list
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            old_key, old = self.entries.popitem(last=False)
+            self.bytes -= old.nbytes()
+
+    def trim(self, max_bytes):
+        """Evict least recently used display lists until at most max_bytes remain in memory."""
+        while self.entries and self.bytes > max_bytes:
+            old_key, old = self.entries.popitem(last=False)
+            self.bytes -= old.nbytes()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+# Shared by every tab of the browser.
+LAYOUT_CACHE = LayoutCache()
@@ -0,0 +1,72 @@
+# loader.py
+import queue
+import threading
+import time
+
+from html_parser import HTMLParser
+from layout_cache import content_key
+from memory import track_stage
+from profiler import span
+from style import compute_styles
+
+# Milliseconds between checks of the loader's queue from the Tk event loop.
+POLL_INTERVAL = 10
+
+
+class PageLoader:
+    """
+    Fetches, parses and styles a page on a worker thread, so the Tk main
+    thread stays responsive. Each finished stage is put on a thread-safe
+    queue as (stage, value, seconds since start):
+      ("body", source text), ("tree", styled root node) or ("error", exception).
+    The content key of the source (for the layout cache) is set before "body".
+    The main thread collects them with poll(), usually from a Tk after() loop.
+    Layout stays on the main thread because Tk fonts can only be used there.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.results = queue.Queue()
+        self.started = time.perf_counter()
+        self.cancelled = False
+        self.content = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        """Drop the results; the thread finishes its current stage and stops."""
+        self.cancelled = True
+
+    def put(self, stage, value):
+        if not self.cancelled:
+            self.results.put((stage, value, time.perf_counter() - self.started))
+
+    def run(self):
+        try:
+            with span("URL.request", "fetch", url=self.url.get_url_without_view_source()), track_stage("fetch"):
+                body = self.url.request()
+            self.content = content_key(body, "view-source" if self.url.view_source else "html")
+            self.put("body", body)
+            if self.url.view_source or self.cancelled:
+                return
+            with span("HTMLParser.parse", "parse", bytes=len(body)), track_stage("parse"):
+                nodes = HTMLParser(body).parse()
+            if self.cancelled:
+                return
+            with span("compute_styles", "style"), track_stage("style"):
+                compute_styles(nodes)
+            self.put("tree", nodes)
+        except Exception as e:
+            self.put("error", e)
+
+    def poll(self):
+        """Return the stages finished since the last call, without blocking."""
+        stages = []
+        while True:
+            try:
+                stages.append(self.results.get_nowait())
+            except queue.Empty:
+                return stages
@@ -1,11 +1,41 @@
 # main.py
+import argparse
 import sys
-from url import URL
-from browser import Browser
-import tkinter
 
 if __name__ == '__main__':
-    # If no URL is provided, default to about:blank.
-    url_str = sys.argv[1] if len(sys.argv) > 1 else "about:blank"
-    Browser().load(URL(url_str))
+    # Headless mode: python main.py --headless <sources> [options], see batch_render.py
+    if len(sys.argv) > 1 and sys.argv[1] == "--headless":
+        from batch_render import main
+        sys.exit(main(sys.argv[2:]))
+    # The browser and Tk are imported only once a window is actually needed.
+    import tracemalloc
+    import tkinter
+    import memory
+    import profiler
+    from browser import Browser
+    from url import URL
+    parser = argparse.ArgumentParser(description="A simple web browser.")
+    # If no URL is provided, default to about:blank. Each URL opens in its own tab.
+    parser.add_argument("urls", nargs="*", default=["about:blank"])
+    parser.add_argument("--profile", metavar="PATH",
+                        help="write a Chrome trace of fetch/parse/style/layout/draw to PATH on exit")
+    parser.add_argument("--profile-sample", type=float, nargs="?", const=profiler.SAMPLE_INTERVAL * 1000,
+                        metavar="MS", help="with --profile, also sample parser/layout functions every MS ms")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="trace allocations and print where memory went on exit")
+    parser.add_argument("--memory-limit", type=memory.parse_limit, action="append", default=[],
+                        metavar="CATEGORY=BYTES", help="soft limit for a shared cache, e.g. response_cache=8M")
+    args = parser.parse_args()
+    if args.profile:
+        profiler.start(args.profile_sample / 1000 if args.profile_sample else None)
+    if args.memory_report:
+        tracemalloc.start()
+    browser = Browser(memory_limits=dict(args.memory_limit))
+    for url_str in args.urls:
+        browser.new_tab(URL(url_str))
+    browser.activate(browser.tabs[0])
     tkinter.mainloop()
+    if args.profile:
+        profiler.stop(args.profile)
+    if args.memory_report:
+        print(memory.format_report(browser.memory_report()), file=sys.stderr)
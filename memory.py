@@ -0,0 +1,253 @@
+# memory.py
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import tracemalloc
+
+import url
+from font_metrics import TK_METRICS
+from tabs import MEASURE_ENTRY_BYTES, layout_bytes, tree_bytes
+
+# Rough cost of one font: the Tk font and its hidden Label widget live in
+# Tcl's memory, which neither sys.getsizeof nor tracemalloc can see.
+FONT_ENTRY_BYTES = 4096
+
+# Report categories, in display order. Only those with an evictor in
+# enforce_limits() accept a soft limit.
+CATEGORIES = ("response_cache", "dom", "layout", "display_lists", "fonts", "measure_cache",
+              "emoji_images", "layout_cache", "page_cache")
+EVICTABLE = ("response_cache", "measure_cache", "layout_cache", "page_cache")
+
+# Returned by track_stage() while tracemalloc is off.
+NULL_STAGE = contextlib.nullcontext()
+
+# Load stage -> {"calls", "peak", "growth", "retained"} in bytes, the
+# largest seen; see track_stage().
+STAGE_PEAKS = {}
+active_stages = []  # [name, bytes at start, peak bytes seen] per open stage
+stage_lock = threading.Lock()
+
+
+def response_cache_bytes():
+    # Stored (usually compressed) size, the same figure the cache budgets with.
+    return url.response_cache.bytes
+
+
+def fonts_bytes(metrics=TK_METRICS):
+    return sys.getsizeof(metrics.fonts) + len(metrics.fonts) * FONT_ENTRY_BYTES
+
+
+def measure_cache_bytes(metrics=TK_METRICS):
+    return len(metrics.cache.widths) * MEASURE_ENTRY_BYTES
+
+
+def emoji_images_bytes():
+    # Tk keeps photo images as 32-bit pixels.
+    return sum(image.width() * image.height() * 4
+               for image in url.emoji_images.values() if image is not None)
+
+
+def estimate(tabs=(), page_cache=None, layout_cache=None, metrics=TK_METRICS):
+    """Estimated bytes per category for the given open tabs and shared caches."""
+    sizes = dict.fromkeys(CATEGORIES, 0)
+    sizes["response_cache"] = response_cache_bytes()
+    sizes["fonts"] = fonts_bytes(metrics)
+    sizes["measure_cache"] = measure_cache_bytes(metrics)
+    sizes["emoji_images"] = emoji_images_bytes()
+    for tab in tabs:
+        if tab.nodes is not None:
+            sizes["dom"] += tree_bytes(tab.nodes)
+        if tab.source is not None:
+            sizes["dom"] += sys.getsizeof(tab.source)
+        if tab.layout is not None:
+            # The layout's own display list is counted with the others.
+            sizes["layout"] += layout_bytes(tab.layout) - tab.layout.display_list.nbytes()
+        if tab.display_list is not None:
+            sizes["display_lists"] += tab.display_list.nbytes()
+    if layout_cache is not None:
+        sizes["layout_cache"] = layout_cache.bytes
+    if page_cache is not None:
+        sizes["page_cache"] = page_cache.bytes
+    return sizes
+
+
+def fold_peak():
+    current, peak = tracemalloc.get_traced_memory()
+    for record in active_stages:
+        record[2] = max(record[2], peak)
+    return current
+
+
+@contextlib.contextmanager
+def measure_stage(name):
+    with stage_lock:
+        current = fold_peak()
+        record = [name, current, current]
+        active_stages.append(record)
+        # Start a new peak window; open stages keep the peak folded in above.
+        tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        with stage_lock:
+            current = fold_peak()
+            active_stages.remove(record)
+        name, start, peak = record
+        entry = STAGE_PEAKS.setdefault(name, {"calls": 0, "peak": 0, "growth": 0, "retained": 0})
+        entry["calls"] += 1
+        entry["peak"] = max(entry["peak"], peak)
+        entry["growth"] = max(entry["growth"], peak - start)
+        entry["retained"] = max(entry["retained"], current - start)
+
+
+def track_stage(name):
+    """
+    Record the peak traced memory while a load stage runs. tracemalloc is
+    process-wide, so stages overlapping on other threads share their peaks.
+    Costs one call while tracemalloc is off.
+    """
+    if not tracemalloc.is_tracing():
+        return NULL_STAGE
+    return measure_stage(name)
+
+
+def top_modules(snapshot, limit=10):
+    """(module file, bytes) of the modules that allocated the most live memory."""
+    totals = {}
+    for stat in snapshot.statistics("filename"):
+        name = os.path.basename(stat.traceback[0].filename)
+        totals[name] = totals.get(name, 0) + stat.size
+    return sorted(totals.items(), key=lambda item: -item[1])[:limit]
+
+
+def memory_report(tabs=(), page_cache=None, layout_cache=None, metrics=TK_METRICS, top=10):
+    """
+    Bytes per structure (estimated, see estimate()), per-stage peaks and,
+    while tracemalloc is tracing, the traced totals and the modules that
+    allocated the most live memory.
+    """
+    traced = None
+    if tracemalloc.is_tracing():
+        # Snapshot first: reading __dict__ in the estimators materializes
+        # instance dicts, which would show up as allocations of their own.
+        current, peak = tracemalloc.get_traced_memory()
+        traced = {"current": current, "peak": peak, "modules": top_modules(tracemalloc.take_snapshot(), top)}
+    sizes = estimate(tabs, page_cache, layout_cache, metrics)
+    report = {
+        "estimated": sizes,
+        "estimated_total": sum(sizes.values()),
+        "stages": {name: dict(entry) for name, entry in STAGE_PEAKS.items()},
+    }
+    if traced is not None:
+        report["traced"] = traced
+    return report
+
+
+def enforce_limits(limits, page_cache=None, layout_cache=None, metrics=TK_METRICS):
+    """
+    Evict from every cache over its soft limit (category -> bytes).
+    Returns category -> bytes freed. The DOM, layouts and display lists
+    belong to tabs (see Browser.memory_budget); fonts and emoji images stay
+    referenced by drawn items, so they are reported but never evicted here.
+    """
+    freed = {}
+    for category, limit in limits.items():
+        if category not in EVICTABLE:
+            raise ValueError(f"no soft limit for {category!r}; choose from {', '.join(EVICTABLE)}")
+        if category == "response_cache":
+            before = response_cache_bytes()
+            if before > limit:
+                url.response_cache.trim(limit)
+                freed[category] = before - response_cache_bytes()
+        elif category == "measure_cache":
+            before = measure_cache_bytes(metrics)
+            if before > limit:
+                metrics.cache.trim(limit // MEASURE_ENTRY_BYTES)
+                freed[category] = before - measure_cache_bytes(metrics)
+        else:
+            cache = layout_cache if category == "layout_cache" else page_cache
+            if cache is not None and cache.bytes > limit:
+                before = cache.bytes
+                cache.trim(limit)
+                freed[category] = before - cache.bytes
+    return freed
+
+
+def parse_limit(text):
+    """Parse a CATEGORY=BYTES soft limit; BYTES may end in K, M or G."""
+    category, sep, size = text.partition("=")
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    scale = units.get(size[-1:].upper(), 1)
+    if scale != 1:
+        size = size[:-1]
+    if not sep or category not in EVICTABLE or not size.isdigit():
+        raise argparse.ArgumentTypeError(f"expected CATEGORY=BYTES with CATEGORY one of {', '.join(EVICTABLE)}")
+    return category, int(size) * scale
+
+
+def format_report(report):
+    lines = ["Estimated bytes:"]
+    for category, size in report["estimated"].items():
+        lines.append(f"  {category:16} {size / 1024:12.1f} KB")
+    lines.append(f"  {'total':16} {report['estimated_total'] / 1024:12.1f} KB")
+    if report["stages"]:
+        lines.append("Peak traced memory per stage (growth over the stage start):")
+        for name, entry in report["stages"].items():
+            lines.append(f"  {name:16} {entry['peak'] / 1024:12.1f} KB  (+{entry['growth'] / 1024:.1f} KB)")
+    traced = report.get("traced")
+    if traced:
+        lines.append(f"Traced: {traced['current'] / 1024:.1f} KB now, {traced['peak'] / 1024:.1f} KB peak")
+        for module, size in traced["modules"]:
+            lines.append(f"  {module:24} {size / 1024:12.1f} KB")
+    return "\n".join(lines)
+
+
+def load_headless(url_str, metrics, width=None):
+    """Fetch, parse, style and lay out one page with headless metrics, tracking stages. Returns a Tab."""
+    from html_parser import HTMLParser
+    from layout import WIDTH, Layout
+    from style import compute_styles
+    from tabs import Tab
+    tab = Tab(url.URL(url_str))
+    tab.width = width or WIDTH
+    with track_stage("fetch"):
+        body = tab.url.request()
+    with track_stage("parse"):
+        tab.nodes = HTMLParser(body).parse()
+    with track_stage("style"):
+        compute_styles(tab.nodes)
+    with track_stage("layout"):
+        tab.layout = Layout(tab.nodes, tab.width, metrics)
+    tab.display_list = tab.layout.display_list
+    return tab
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report where a page load's memory goes, without a display.")
+    parser.add_argument("urls", nargs="+")
+    parser.add_argument("--width", type=int, help="layout width in pixels")
+    parser.add_argument("--limit", type=parse_limit, action="append", default=[], metavar="CATEGORY=BYTES",
+                        help="soft limit enforced after each load, e.g. response_cache=8M (repeatable)")
+    parser.add_argument("--top", type=int, default=10, help="modules to list from the tracemalloc snapshot")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    from font_metrics import HeadlessFontMetrics
+    metrics = HeadlessFontMetrics()
+    tracemalloc.start()
+    tabs = []
+    for url_str in args.urls:
+        tabs.append(load_headless(url_str, metrics, args.width))
+        freed = enforce_limits(dict(args.limit), metrics=metrics)
+        if freed:
+            print("Evicted:", freed, file=sys.stderr)
+    report = memory_report(tabs, metrics=metrics, top=args.top)
+    tracemalloc.stop()
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+# parallel_layout.py
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+from font_metrics import TkFontMetrics
+from html_parser import Element, Text
+from layout import BLOCK_ELEMENTS, BlockBox, Layout
+
+# Consecutive siblings are gathered into one unit of work until it holds
+# about 1 / (workers * SPLIT_FACTOR) of the document's nodes; blocks bigger
+# than that are split into their children so the pool gets enough pieces
+# to balance.
+SPLIT_FACTOR = 4
+
+# Shared with the workers by forking: the font backend, the units of work,
+# (container element, first child, end child), and the position of every
+# block element in document order. Set by build_parallel before the pool
+# starts, so tasks only carry a unit's index.
+worker_metrics = None
+shared_units = None
+shared_block_index = None
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def can_fork():
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def index_tree(root):
+    """
+    Without recursing: the number of nodes under (and including) every
+    element with children (others count 1), and the block elements in the
+    order Layout creates their boxes.
+    """
+    sizes = {}
+    blocks = []
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Text):
+            continue
+        if node.tag in BLOCK_ELEMENTS:
+            blocks.append(node)
+        if node.children:
+            order.append(node)
+            stack.extend(reversed(node.children))
+    for node in reversed(order):
+        sizes[node] = 1 + sum([sizes.get(child, 1) for child in node.children])
+    return sizes, blocks
+
+
+def flatten(boxes):
+    """
+    The box trees under boxes as one flat pre-order list of (index of the
+    parent in the list or -1, box), ready to pickle quickly and at any
+    nesting depth: child lists and derived line-breaking columns are
+    dropped, nodes are replaced by their document-order block index, word
+    columns become arrays and equal font keys one shared object.
+    """
+    flat = []
+    keys = {}
+    stack = [(box, -1) for box in reversed(boxes)]
+    while stack:
+        box, parent = stack.pop()
+        index = len(flat)
+        flat.append((parent, box))
+        if isinstance(box, BlockBox):
+            stack.extend((child, index) for child in reversed(box.children))
+            box.children = []
+            box.parent = None
+            box.node = shared_block_index[box.node]
+            continue
+        box.xs = array("i", box.xs)
+        box.ys = array("i", box.ys)
+        box.fonts = None  # The parent looks its own fonts up by key
+        for run in box.runs:
+            run.keys = [keys.setdefault(key, key) for key in run.keys]
+            run.widths = array("i", run.widths)
+            run.spaces = array("i", run.spaces)
+            run.columns = None  # Recomputed by Run.prepare() if a reflow needs it
+    return flat
+
+
+def layout_unit(index, width):
+    """
+    Worker entry point: lay out one unit of sibling nodes, already styled,
+    the way the container's own Layout.collect would, and return flatten() of
+    the resulting boxes.
+    """
+    container, start, end = shared_units[index]
+    # A tagless wrapper with the container's style stands in for the container.
+    wrapper = Element("", {}, None)
+    wrapper.children = container.children[start:end]
+    wrapper.style = container.style
+    layout = Layout(wrapper, width, worker_metrics, defer=True)
+    layout.premeasure(wrapper)
+    layout.collect(layout.root_box)
+    layout.root_box.layout(width, worker_metrics)
+    return flatten(layout.root_box.children)
+
+
+def plan(layout, sizes, threshold):
+    """
+    Create the boxes of blocks too big for one unit and cut every such
+    block's children into units: runs of consecutive siblings holding about
+    threshold nodes, ending only next to a block child, where serial layout
+    ends its inline content too. Returns the units and, per big block, its
+    box with the parts (unit indices or child boxes) its children come from.
+    """
+    units = []
+    containers = []
+    stack = [layout.root_box]
+    while stack:
+        box = stack.pop()
+        layout.boxes[box.node] = box
+        box.children = []
+        box.dirty = False
+        box.layout_dirty = True
+        parts = []
+        children = box.node.children
+        start = size = 0
+        for i, child in enumerate(children):
+            block = isinstance(child, Element) and child.tag in BLOCK_ELEMENTS
+            child_size = sizes.get(child, 1)
+            if block and (size >= threshold or child_size > threshold) and i > start:
+                parts.append(len(units))
+                units.append((box.node, start, i))
+                start, size = i, 0
+            if block and child_size > threshold:
+                child_box = BlockBox(child, box)
+                parts.append(child_box)
+                stack.append(child_box)
+                start = i + 1
+                continue
+            size += child_size
+            if block and size >= threshold:
+                parts.append(len(units))
+                units.append((box.node, start, i + 1))
+                start, size = i + 1, 0
+        if start < len(children):
+            parts.append(len(units))
+            units.append((box.node, start, len(children)))
+        containers.append((box, parts))
+    return units, containers
+
+
+def stitch(layout, box, flat, blocks, fonts):
+    """
+    Attach a unit's flattened boxes to box, linking them back to the DOM and
+    giving their words the parent's own font objects (fonts maps font keys
+    to them), so the display list interns the same few fonts a serial build does.
+    """
+    boxes = [child for parent, child in flat]
+    for parent, child in flat:
+        owner = box if parent < 0 else boxes[parent]
+        owner.children.append(child)
+        if isinstance(child, BlockBox):
+            child.parent = owner
+            child.node = blocks[child.node]
+            layout.boxes[child.node] = child
+            continue
+        keys = list(chain.from_iterable(run.keys for run in child.runs))
+        for key in set(keys).difference(fonts):
+            fonts[key] = layout.metrics.info(key).font
+        child.fonts = list(map(fonts.__getitem__, keys))
+
+
+def build_parallel(layout, workers):
+    """
+    Build layout.root_box with runs of sibling blocks laid out in a process
+    pool, then stitch the returned boxes into the tree in document order.
+    The result matches a serial build exactly, and the boxes are linked back
+    to the DOM, so reflow(), mark_dirty() and update() work as usual.
+    Workers read the styled DOM they inherit by forking; where processes
+    cannot fork, the tree is built serially.
+    """
+    global worker_metrics, shared_units, shared_block_index
+    if isinstance(layout.metrics, TkFontMetrics):
+        raise ValueError("Parallel layout needs a headless font metrics backend")
+    root = layout.root_box.node
+    if not can_fork():
+        layout.premeasure(root)
+        layout.collect(layout.root_box)
+        return
+    sizes, blocks = index_tree(root)
+    threshold = max(1, sizes.get(root, 1) // (workers * SPLIT_FACTOR))
+    units, containers = plan(layout, sizes, threshold)
+    worker_metrics, shared_units = layout.metrics, units
+    shared_block_index = {node: i for i, node in enumerate(blocks)}
+    fonts = {}
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(units)) or 1,
+                                 mp_context=multiprocessing.get_context("fork")) as pool:
+            futures = [pool.submit(layout_unit, index, layout.width) for index in range(len(units))]
+            # Containers were planned parents first, so their child boxes already exist here.
+            for box, parts in containers:
+                for part in parts:
+                    if isinstance(part, BlockBox):
+                        box.children.append(part)
+                    else:
+                        stitch(layout, box, futures[part].result(), blocks, fonts)
+    finally:
+        worker_metrics = shared_units = shared_block_index = None
@@ -0,0 +1,244 @@
+# profiler.py
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+# Modules whose functions the sampler attributes time to.
+SAMPLED_MODULES = {"html_parser", "layout", "style", "view_source", "font_metrics",
+                   "display_list", "parallel_layout", "renderer", "url"}
+SAMPLE_INTERVAL = 0.001  # Seconds between samples in sampling mode
+# Sampled stacks of the thread with span tid N go on track SAMPLE_TID_BASE + N.
+SAMPLE_TID_BASE = 1000
+
+# Returned by span() while tracing is off, so instrumentation costs one call.
+NULL_SPAN = contextlib.nullcontext()
+
+
+class Span:
+    """Context manager that records one complete ("X") trace event."""
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.tracer.add(self.name, self.cat, self.start, end - self.start, self.args)
+        return False
+
+
+class Tracer:
+    """
+    Collects pipeline spans and writes them in Chrome trace-event JSON
+    (open the file in chrome://tracing or https://ui.perfetto.dev).
+    Tracing is off until start(). With a sample interval, a background
+    thread also samples every other thread's stack and turns runs of
+    identical parser/layout frames into events on a "samples" track per thread.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = time.perf_counter()
+        self.threads = {}  # threading ident -> small trace tid
+        self.sample_interval = None
+        self.samples = []  # (time, thread ident, (frame name, ...) outermost first)
+        self.thread_names = {}  # thread ident -> threading name, for sampled threads
+        self.sampler = None
+        self.sampling = False
+
+    def start(self, sample_interval=None):
+        self.events = []
+        self.samples = []
+        self.origin = time.perf_counter()
+        self.enabled = True
+        self.sample_interval = sample_interval
+        if sample_interval:
+            self.sampling = True
+            self.sampler = threading.Thread(target=self.sample_loop, name="sampler", daemon=True)
+            self.sampler.start()
+
+    def stop(self):
+        self.enabled = False
+        self.sampling = False
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+
+    def tid(self, ident=None):
+        if ident is None:
+            ident = threading.get_ident()
+        tid = self.threads.get(ident)
+        if tid is None:
+            tid = self.threads[ident] = len(self.threads) + 1
+        return tid
+
+    def span(self, name, cat="pipeline", **args):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, cat, args)
+
+    def add(self, name, cat, start, duration, args=None):
+        event = {"name": name, "cat": cat, "ph": "X", "pid": 1, "tid": self.tid(),
+                 "ts": (start - self.origin) * 1e6, "dur": duration * 1e6}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def sample_loop(self):
+        own = threading.get_ident()
+        while self.sampling:
+            when = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in self.thread_names:
+                    self.thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                    self.thread_names.setdefault(ident, None)
+                stack = []
+                while frame is not None:
+                    module = os.path.splitext(os.path.basename(frame.f_code.co_filename))[0]
+                    if module in SAMPLED_MODULES:
+                        stack.append(f"{module}.{frame.f_code.co_name}")
+                    frame = frame.f_back
+                self.samples.append((when, ident, tuple(reversed(stack))))
+            time.sleep(self.sample_interval)
+
+    def sample_events(self):
+        """Merge each thread's consecutive samples sharing a stack prefix into nested events."""
+        events = []
+        opened = {}  # thread ident -> [name, start] per stack depth
+        end = self.samples[-1][0] if self.samples else self.origin
+        for when, ident, stack in self.samples + [(end, ident, ()) for ident in self.sampled_threads()]:
+            frames = opened.setdefault(ident, [])
+            common = 0
+            while common < len(frames) and common < len(stack) and frames[common][0] == stack[common]:
+                common += 1
+            for name, start in reversed(frames[common:]):
+                events.append({"name": name, "cat": "sample", "ph": "X", "pid": 1,
+                               "tid": SAMPLE_TID_BASE + self.tid(ident),
+                               "ts": (start - self.origin) * 1e6, "dur": (when - start) * 1e6})
+            del frames[common:]
+            frames.extend([name, when] for name in stack[common:])
+        return events
+
+    def sampled_threads(self):
+        """Idents of the threads that have samples, in order of their first sample."""
+        return list(dict.fromkeys(ident for when, ident, stack in self.samples))
+
+    def sample_summary(self, top=15):
+        """
+        (function, share of sampling ticks) for the functions most often on
+        top of a stack. Threads are sampled together, so shares can add up
+        to more than one when several threads are busy.
+        """
+        counts = {}
+        for when, ident, stack in self.samples:
+            if stack:
+                counts[stack[-1]] = counts.get(stack[-1], 0) + 1
+        total = len({when for when, ident, stack in self.samples}) or 1
+        return sorted(((name, count / total) for name, count in counts.items()),
+                      key=lambda item: -item[1])[:top]
+
+    def thread_name(self, ident, tid):
+        if ident == threading.main_thread().ident:
+            return "main"
+        return self.thread_names.get(ident) or f"thread {tid}"
+
+    def trace(self):
+        sample_events = self.sample_events()  # Registers tids for sampled threads too
+        names = {tid: self.thread_name(ident, tid) for ident, tid in self.threads.items()}
+        for ident in self.sampled_threads():
+            tid = self.tid(ident)
+            names[SAMPLE_TID_BASE + tid] = f"samples: {self.thread_name(ident, tid)}"
+        metadata = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                    for tid, name in names.items()]
+        return {"traceEvents": metadata + self.events + sample_events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.trace(), f)
+
+
+# The tracer the pipeline reports to.
+TRACER = Tracer()
+
+
+def span(name, cat="pipeline", **args):
+    return TRACER.span(name, cat, **args)
+
+
+def start(sample_interval=None):
+    """Start tracing (and sampling, if an interval in seconds is given)."""
+    TRACER.start(sample_interval)
+
+
+def stop(path=None):
+    """Stop tracing; write the Chrome trace to path if given. Returns the tracer."""
+    TRACER.stop()
+    if path:
+        TRACER.save(path)
+    return TRACER
+
+
+def profile_load(url_str, path, width=None, sample_interval=None):
+    """
+    Headless equivalent of main.py --profile for one page: fetch, parse,
+    style, layout and reflow under the tracer, then write the trace.
+    """
+    from font_metrics import HeadlessFontMetrics
+    from html_parser import HTMLParser
+    from layout import WIDTH, Layout
+    from style import compute_styles
+    from url import URL
+    width = width or WIDTH
+    start(sample_interval)
+    try:
+        url = URL(url_str)
+        with span("URL.request", "fetch", url=url_str):
+            body = url.request()
+        with span("HTMLParser.parse", "parse", bytes=len(body)):
+            nodes = HTMLParser(body).parse()
+        with span("compute_styles", "style"):
+            compute_styles(nodes)
+        with span("Layout", "layout", width=width):
+            layout = Layout(nodes, width, HeadlessFontMetrics())
+        with span("Layout.reflow", "layout", width=width // 2):
+            layout.reflow(width // 2)
+    finally:
+        tracer = stop(path)
+    return tracer
+
+
+def print_summary(tracer, file=sys.stderr):
+    for event in tracer.events:
+        print(f"{event['name']:24} {event['dur'] / 1000:10.2f} ms", file=file)
+    for name, share in tracer.sample_summary():
+        print(f"  {share:6.1%}  {name}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile loading a page without a display.")
+    parser.add_argument("url")
+    parser.add_argument("-o", "--output", default="trace.json", help="Chrome trace file (default: trace.json)")
+    parser.add_argument("--width", type=int, help="layout width in pixels")
+    parser.add_argument("--sample", type=float, nargs="?", const=SAMPLE_INTERVAL * 1000, metavar="MS",
+                        help="also sample parser/layout functions every MS milliseconds (default: 1)")
+    args = parser.parse_args(argv)
+    tracer = profile_load(args.url, args.output, args.width, args.sample / 1000 if args.sample else None)
+    print_summary(tracer)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
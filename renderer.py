@@ -0,0 +1,84 @@
+# renderer.py
+from url import get_emoji_image
+
+# Pixels drawn above and below the window, so text whose top edge is just
+# off screen (and the next lines to scroll in) is already on the canvas.
+OVERSCAN = 100
+
+SCROLLBAR_WIDTH = 10
+MIN_THUMB_HEIGHT = 20
+
+
+class RetainedRenderer:
+    """
+    Keeps the canvas items of the display-list entries it has drawn instead
+    of deleting and recreating everything each frame. On scroll, the drawn
+    items are shifted with one canvas.move, and only the entries entering or
+    leaving the window (plus overscan) are created or deleted. The scrollbar
+    thumb is a single item whose coordinates are updated in place.
+    """
+
+    def __init__(self, canvas, overscan=OVERSCAN):
+        self.canvas = canvas
+        self.overscan = overscan
+        self.display_list = None
+        self.items = {}  # Display-list index -> canvas item id
+        self.drawn = range(0)  # Indices that currently have items
+        self.drawn_scroll = 0  # Scroll offset the items are positioned for
+        self.thumb = None
+
+    def set_display_list(self, display_list):
+        """Start over with a new display list (new page or relayout), or None for a blank canvas."""
+        self.canvas.delete("content")
+        self.items = {}
+        self.drawn = range(0)
+        self.drawn_scroll = 0
+        self.display_list = display_list
+        if display_list is None and self.thumb is not None:
+            self.canvas.itemconfigure(self.thumb, state="hidden")
+
+    def create_item(self, i, scroll):
+        x, y, txt, font, is_emoji, color = self.display_list.entry(i)
+        img = get_emoji_image(txt) if is_emoji else None
+        if img is not None:
+            return self.canvas.create_image(x, y - scroll, image=img, anchor="nw", tags="content")
+        # Emoji without an image fall back to plain text.
+        return self.canvas.create_text(x, y - scroll, text=txt, anchor="nw", font=font, fill=color,
+                                       tags="content")
+
+    def render(self, scroll, width, height):
+        if self.display_list is None:
+            return
+        # Shift what is already drawn instead of redrawing it.
+        if scroll != self.drawn_scroll and self.items:
+            self.canvas.move("content", 0, self.drawn_scroll - scroll)
+        self.drawn_scroll = scroll
+        wanted = self.display_list.index_range(scroll - self.overscan, scroll + height + self.overscan)
+        drawn = self.drawn
+        # Both ranges are contiguous, so only their ends differ; the overlap is left alone.
+        for i in (*range(drawn.start, min(drawn.stop, wanted.start)),
+                  *range(max(drawn.start, wanted.stop), drawn.stop)):
+            self.canvas.delete(self.items.pop(i))
+        for i in (*range(wanted.start, min(wanted.stop, drawn.start)),
+                  *range(max(wanted.start, drawn.stop), wanted.stop)):
+            self.items[i] = self.create_item(i, scroll)
+        self.drawn = wanted
+        self.update_scrollbar(scroll, width, height)
+
+    def update_scrollbar(self, scroll, width, height):
+        max_y = self.display_list.height
+        if max_y <= height:
+            if self.thumb is not None:
+                self.canvas.itemconfigure(self.thumb, state="hidden")
+            return
+        max_scroll = max(0, max_y - height)
+        thumb_height = max(height * (height / max_y), MIN_THUMB_HEIGHT)
+        thumb_y = (scroll / max_scroll) * (height - thumb_height) if max_scroll > 0 else 0
+        coords = (width - SCROLLBAR_WIDTH, thumb_y, width, thumb_y + thumb_height)
+        if self.thumb is None:
+            self.thumb = self.canvas.create_rectangle(*coords, fill="blue", tags="scrollbar")
+        else:
+            self.canvas.coords(self.thumb, *coords)
+            self.canvas.itemconfigure(self.thumb, state="normal")
+        # Keep the thumb above text created after it.
+        self.canvas.tag_raise(self.thumb)
@@ -0,0 +1,137 @@
+# response_cache.py
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from typing import NamedTuple
+
+MAX_BYTES = 64 * 1024 * 1024
+# zlib level used when recompressing bodies the server sent uncompressed;
+# level 1 is several times faster than the default and nearly as small on HTML.
+FAST_LEVEL = 1
+
+
+class CachedResponse(NamedTuple):
+    body: object  # str when stored as text, otherwise bytes in the given encoding
+    encoding: str  # "text", "gzip" (as the server sent it), "zlib" or "identity" (UTF-8 bytes)
+    expires: object  # time.time() deadline, or None for no expiry
+    size: int  # Bytes counted against the cache budget
+    text_size: int  # Bytes the decoded str takes, for the compression ratio
+
+
+class ResponseCache:
+    """
+    LRU cache of HTTP response bodies keyed by canonical URL. With compress
+    on, bodies are kept as bytes: a gzip body exactly as the server sent it,
+    anything else recompressed with zlib at FAST_LEVEL (or left as plain
+    bytes when that does not help). They are decompressed and decoded only
+    on a hit, and the budget counts the stored size, so the same memory
+    holds several times more pages. stats() reports the time hits spend
+    decoding, to weigh that against the memory saved.
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES, compress=True, level=FAST_LEVEL):
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.level = level
+        self.entries = OrderedDict()  # canonical URL -> CachedResponse
+        self.bytes = 0
+        self.text_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.decode_time = 0.0  # Seconds spent decompressing and decoding on hits
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return the cached body as a str, or None if absent or expired."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires is not None and time.time() >= entry.expires:
+            self.pop(key)
+            self.expired += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        if entry.encoding == "text":
+            return entry.body
+        start = time.perf_counter()
+        content = self.decode(entry)
+        self.decode_time += time.perf_counter() - start
+        return content
+
+    def decode(self, entry):
+        data = entry.body
+        if entry.encoding == "gzip":
+            import gzip
+            data = gzip.decompress(data)
+        elif entry.encoding == "zlib":
+            data = zlib.decompress(data)
+        return data.decode("utf-8", errors="replace")
+
+    def put(self, key, content, expires=None, body=None, encoding="identity"):
+        """
+        Store a response. content is the decoded text; body and encoding are
+        the bytes as received ("gzip" or "identity"), kept when compressing.
+        """
+        text_size = sys.getsizeof(content)
+        if not self.compress:
+            stored, encoding = content, "text"
+        elif encoding == "gzip":
+            stored = body
+        else:
+            raw = body if body is not None else content.encode("utf-8")
+            stored = zlib.compress(raw, self.level)
+            encoding = "zlib"
+            if len(stored) >= len(raw):
+                stored, encoding = raw, "identity"
+        self.pop(key)
+        size = sys.getsizeof(key) + sys.getsizeof(stored)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = CachedResponse(stored, encoding, expires, size, text_size)
+        self.bytes += size
+        self.text_bytes += text_size
+        self.trim(self.max_bytes)
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+            self.text_bytes -= entry.text_size
+        return entry
+
+    def trim(self, max_bytes):
+        """Evict least recently used responses until at most max_bytes remain."""
+        while self.entries and self.bytes > max_bytes:
+            self.pop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = self.text_bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "text_bytes": self.text_bytes,
+            "ratio": self.text_bytes / self.bytes if self.bytes else 0.0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "decode_ms": self.decode_time * 1000,
+            "mean_decode_ms": self.decode_time * 1000 / self.hits if self.hits else 0.0,
+        }
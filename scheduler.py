@@ -0,0 +1,62 @@
+# scheduler.py
+import time
+from collections import deque
+
+TARGET_FPS = 60
+
+
+class FrameScheduler:
+    """
+    Coalesces draw requests into at most one frame per frame interval.
+    Input handlers call request() as often as events arrive; only the first
+    request schedules a frame (with after_idle, or with after when the last
+    frame was too recent), and the rest are folded into it and counted as
+    dropped frames. Frame durations are kept against a per-frame budget.
+    """
+
+    def __init__(self, widget, draw, fps=TARGET_FPS, clock=time.perf_counter, history=240):
+        self.widget = widget  # Anything with Tk's after() and after_idle()
+        self.draw = draw
+        self.interval = 1 / fps
+        self.budget = self.interval  # A frame should finish within one interval
+        self.clock = clock
+        self.job = None
+        self.last_frame = None  # Start time of the last frame
+        self.requests = 0
+        self.frames = 0
+        self.dropped = 0
+        self.over_budget = 0
+        self.durations = deque(maxlen=history)  # Seconds, most recent frames
+
+    def request(self):
+        """Ask for a frame; requests before it runs are coalesced into it."""
+        self.requests += 1
+        if self.job is not None:
+            self.dropped += 1
+            return
+        wait = 0 if self.last_frame is None else self.last_frame + self.interval - self.clock()
+        if wait > 0:
+            self.job = self.widget.after(max(1, round(wait * 1000)), self.run)
+        else:
+            self.job = self.widget.after_idle(self.run)
+
+    def run(self):
+        self.job = None
+        start = self.last_frame = self.clock()
+        self.draw()
+        duration = self.clock() - start
+        self.frames += 1
+        self.durations.append(duration)
+        if duration > self.budget:
+            self.over_budget += 1
+
+    def stats(self):
+        durations = sorted(self.durations)
+        return {
+            "requests": self.requests,
+            "frames": self.frames,
+            "dropped": self.dropped,
+            "over_budget": self.over_budget,
+            "mean_ms": 1000 * sum(durations) / len(durations) if durations else 0.0,
+            "max_ms": 1000 * durations[-1] if durations else 0.0,
+        }
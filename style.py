@@ -0,0 +1,213 @@
+# style.py
+import re
+from typing import NamedTuple
+
+
+class ComputedStyle(NamedTuple):
+    size: int
+    weight: str  # "normal" or "bold"
+    style: str  # "roman" or "italic"
+    family: object  # Font family name, or None for the default font
+    color: str
+    align: str  # "left" or "center"
+
+    @property
+    def font_key(self):
+        return (self.size, self.weight, self.style, self.family)
+
+
+DEFAULT_STYLE = ComputedStyle(12, "normal", "roman", None, "black", "left")
+
+# What each tag changes relative to its parent's style.
+TAG_DEFAULTS = {
+    "i": {"style": "italic"},
+    "b": {"weight": "bold"},
+    "small": {"size": -2},
+    "big": {"size": 4},
+    "h1": {"align": "center"},
+}
+
+# Font sizes are in points, as Tk expects.
+POINTS_PER_PIXEL = 0.75
+
+
+def parse_inline_style(text):
+    """Parse a style attribute ("color: blue; font-weight: bold") into a dict."""
+    properties = {}
+    for declaration in text.split(";"):
+        if ":" in declaration:
+            name, value = declaration.split(":", 1)
+            properties[name.strip().casefold()] = value.strip()
+    return properties
+
+
+# CSS named colors; Tk 8.6 knows all of them except rebeccapurple, which
+# parse_color spells out. Anything else is not guaranteed to be a Tk color.
+CSS_COLOR_NAMES = frozenset("""
+    aliceblue antiquewhite aqua aquamarine azure beige bisque black blanchedalmond blue
+    blueviolet brown burlywood cadetblue chartreuse chocolate coral cornflowerblue cornsilk
+    crimson cyan darkblue darkcyan darkgoldenrod darkgray darkgreen darkgrey darkkhaki
+    darkmagenta darkolivegreen darkorange darkorchid darkred darksalmon darkseagreen
+    darkslateblue darkslategray darkslategrey darkturquoise darkviolet deeppink deepskyblue
+    dimgray dimgrey dodgerblue firebrick floralwhite forestgreen fuchsia gainsboro ghostwhite
+    gold goldenrod gray green greenyellow grey honeydew hotpink indianred indigo ivory khaki
+    lavender lavenderblush lawngreen lemonchiffon lightblue lightcoral lightcyan
+    lightgoldenrodyellow lightgray lightgreen lightgrey lightpink lightsalmon lightseagreen
+    lightskyblue lightslategray lightslategrey lightsteelblue lightyellow lime limegreen linen
+    magenta maroon mediumaquamarine mediumblue mediumorchid mediumpurple mediumseagreen
+    mediumslateblue mediumspringgreen mediumturquoise mediumvioletred midnightblue mintcream
+    mistyrose moccasin navajowhite navy oldlace olive olivedrab orange orangered orchid
+    palegoldenrod palegreen paleturquoise palevioletred papayawhip peachpuff peru pink plum
+    powderblue purple red rosybrown royalblue saddlebrown salmon sandybrown seagreen seashell
+    sienna silver skyblue slateblue slategray slategrey snow springgreen steelblue tan teal
+    thistle tomato turquoise violet wheat white whitesmoke yellow yellowgreen
+""".split())
+HEX_COLOR = re.compile(r"#([0-9a-f]{3,4}|[0-9a-f]{6}|[0-9a-f]{8})")
+RGB_COLOR = re.compile(r"rgba?\(([^)]*)\)")
+
+
+def parse_rgb(arguments):
+    """Return "#rrggbb" for the arguments of rgb()/rgba(), or None if invalid or transparent."""
+    parts = arguments.replace(",", " ").replace("/", " ").split()
+    if len(parts) not in (3, 4):
+        return None
+    channels = []
+    try:
+        for part in parts[:3]:
+            value = float(part[:-1]) * 2.55 if part.endswith("%") else float(part)
+            channels.append(min(255, max(0, round(value))))
+        if len(parts) == 4:
+            alpha = parts[3]
+            if (float(alpha[:-1]) / 100 if alpha.endswith("%") else float(alpha)) <= 0:
+                return None
+    except ValueError:
+        return None
+    return "#%02x%02x%02x" % tuple(channels)
+
+
+def parse_color(value, parent_color):
+    """
+    Turn a CSS color into one Tk can draw: a named color, #rgb or #rrggbb
+    (alpha is dropped) or rgb()/rgba() converted to #rrggbb. Keywords like
+    inherit, currentColor and transparent, and anything unrecognized, keep
+    the parent's color, so the canvas is never handed an invalid fill.
+    """
+    value = value.casefold().replace("!important", "").strip()
+    if value in CSS_COLOR_NAMES:
+        return value
+    if value == "rebeccapurple":
+        return "#663399"
+    if HEX_COLOR.fullmatch(value):
+        digits = value[1:]
+        return "#" + (digits[:3] if len(digits) == 4 else digits[:6])
+    match = RGB_COLOR.fullmatch(value)
+    if match:
+        return parse_rgb(match.group(1)) or parent_color
+    return parent_color
+
+
+def parse_font_size(value, parent_size):
+    value = value.casefold()
+    try:
+        if value.endswith("px"):
+            return round(float(value[:-2]) * POINTS_PER_PIXEL)
+        if value.endswith("pt"):
+            return round(float(value[:-2]))
+        if value.endswith("%"):
+            return round(parent_size * float(value[:-1]) / 100)
+        if value.endswith("em"):
+            return round(parent_size * float(value[:-2]))
+    except ValueError:
+        pass
+    return parent_size
+
+
+def apply_inline_style(values, properties, parent):
+    """Update a dict of style values from parsed inline-style properties."""
+    if "font-size" in properties:
+        values["size"] = max(1, parse_font_size(properties["font-size"], parent.size))
+    weight = properties.get("font-weight", "").casefold()
+    if weight in ("bold", "bolder") or (weight.isdigit() and int(weight) >= 600):
+        values["weight"] = "bold"
+    elif weight in ("normal", "lighter") or weight.isdigit():
+        values["weight"] = "normal"
+    font_style = properties.get("font-style", "").casefold()
+    if font_style in ("italic", "oblique"):
+        values["style"] = "italic"
+    elif font_style == "normal":
+        values["style"] = "roman"
+    if properties.get("color"):
+        values["color"] = parse_color(properties["color"], parent.color)
+    align = properties.get("text-align", "").casefold()
+    if align == "center":
+        values["align"] = "center"
+    elif align:
+        values["align"] = "left"
+    if properties.get("font-family"):
+        values["family"] = properties["font-family"].split(",")[0].strip().strip("'\"")
+
+
+class StyleCache:
+    """
+    Resolves computed styles with style sharing: elements with the same
+    style-relevant tag, the same style attribute and the same parent style
+    get the very same ComputedStyle object. Styles are also interned by
+    value, so identical styles reached by different paths are shared too.
+    """
+
+    def __init__(self, max_entries=50_000):
+        self.max_entries = max_entries
+        self.shared = {}  # (tag, style attribute, parent style) -> ComputedStyle
+        self.interned = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, tag, attributes, parent):
+        # Only tags with defaults and the style attribute affect the result.
+        key = (tag if tag in TAG_DEFAULTS else "", attributes.get("style"), parent)
+        style = self.shared.get(key)
+        if style is not None:
+            self.hits += 1
+            return style
+        self.misses += 1
+        values = parent._asdict()
+        for name, value in TAG_DEFAULTS.get(key[0], {}).items():
+            values[name] = max(1, values[name] + value) if name == "size" else value
+        if key[1]:
+            apply_inline_style(values, parse_inline_style(key[1]), parent)
+        style = ComputedStyle(**values)
+        style = self.interned.setdefault(style, style)
+        if len(self.shared) >= self.max_entries:
+            self.shared.clear()
+            self.interned.clear()
+        self.shared[key] = style
+        return style
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "distinct_styles": len(self.interned),
+        }
+
+
+# Shared by every document.
+STYLE_CACHE = StyleCache()
+
+
+def compute_styles(root, parent_style=None, cache=STYLE_CACHE):
+    """
+    Store the computed style of every element under root in element.style.
+    Text nodes use their parent element's style.
+    """
+    from html_parser import Text
+    stack = [(root, parent_style or DEFAULT_STYLE)]
+    while stack:
+        node, parent = stack.pop()
+        if isinstance(node, Text):
+            continue
+        node.style = cache.resolve(node.tag, node.attributes, parent)
+        for child in node.children:
+            stack.append((child, node.style))
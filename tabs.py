@@ -0,0 +1,145 @@
+# tabs.py
+import sys
+
+import url
+from font_metrics import TK_METRICS
+from history import CachedPage, History
+from html_parser import Text
+from layout import BlockBox, Layout
+from view_source import SourceLayout
+
+# Default limit on the estimated memory of all open documents plus the
+# shared caches, before background tabs start being discarded.
+MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Rough size of one measure-cache entry: the (font key, text) tuple, the
+# width int and the OrderedDict link. The key's parts are shared.
+MEASURE_ENTRY_BYTES = 150
+
+
+def tree_bytes(root):
+    """Approximate memory held by a DOM tree, walked without recursion."""
+    total = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        total += sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.children)
+        if isinstance(node, Text):
+            total += sys.getsizeof(node.text) + sys.getsizeof(node.words)
+        else:
+            total += sys.getsizeof(node.attributes)
+            stack.extend(node.children)
+    return total
+
+
+def layout_bytes(layout):
+    """Approximate memory held by a Layout: its boxes, measured runs, lines and display list."""
+    total = layout.display_list.nbytes()
+    stack = [layout.root_box]
+    while stack:
+        box = stack.pop()
+        total += sys.getsizeof(box) + sys.getsizeof(box.__dict__)
+        if isinstance(box, BlockBox):
+            total += sys.getsizeof(box.children)
+            stack.extend(box.children)
+            continue
+        # An InlineBox: its placed words and its runs are parallel columns.
+        total += sum(sys.getsizeof(column) for column in (box.xs, box.ys, box.fonts))
+        for run in box.runs:
+            total += sum(sys.getsizeof(column) for column in
+                         (run.texts, run.keys, run.colors, run.widths, run.spaces))
+            if run.columns is not None:
+                total += sum(sys.getsizeof(column) for column in run.columns)
+    return total
+
+
+def shared_cache_bytes():
+    """Approximate memory of the caches every tab shares: responses and text widths."""
+    return url.response_cache.bytes + len(TK_METRICS.cache.widths) * MEASURE_ENTRY_BYTES
+
+
+class Tab:
+    """
+    One open page. A tab owns only its document (tree, layout, display
+    list) and where it is scrolled to; the connection pool, response cache,
+    font registry, measurement cache and style cache are module-level and
+    shared by every tab. A discarded tab keeps just its URL and scroll
+    position and is loaded again when it is next shown.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.scroll = 0
+        self.history = History(url)
+        self.nodes = None  # Root node of the parsed HTML tree.
+        self.source = None  # Raw source text when showing a view-source: page.
+        self.layout = None  # None when the display list came from the layout cache
+        self.display_list = None
+        self.content = None  # Content key of the source, for the layout cache
+        self.width = None  # Width the display list was laid out for
+        self.memory = 0  # Estimated bytes of the document, set by measure_memory()
+        self.last_active = 0  # Activation counter, for picking tabs to discard
+        # Load pipeline state, see Browser.load.
+        self.loader = None
+        self.load_job = None
+        self.steps = None  # Layout.build_steps() of a page still being laid out
+        self.painted_at = None
+        self.load_started = None
+        self.timings = {}  # Load stage -> seconds since the load started
+
+    @property
+    def loading(self):
+        return self.loader is not None or self.steps is not None
+
+    @property
+    def loaded(self):
+        return self.display_list is not None
+
+    def measure_memory(self):
+        self.memory = 0
+        if self.nodes is not None:
+            self.memory += tree_bytes(self.nodes)
+        if self.source is not None:
+            self.memory += sys.getsizeof(self.source)
+        if self.layout is not None:
+            self.memory += layout_bytes(self.layout)
+        return self.memory
+
+    def snapshot(self):
+        """The current document as a CachedPage, for the back/forward cache."""
+        return CachedPage(self.nodes, self.source, self.layout, self.display_list,
+                          self.content, self.width, self.memory)
+
+    def restore(self, page):
+        (self.nodes, self.source, self.layout, self.display_list,
+         self.content, self.width, self.memory) = page
+
+    def make_layout(self, width):
+        """Lay the document out from scratch (used when its display list came from a cache)."""
+        if self.source is not None:
+            return SourceLayout(self.source, width)
+        return Layout(self.nodes, width)
+
+    def discard(self):
+        """Drop the document, keeping the URL and scroll position."""
+        self.nodes = self.source = self.layout = self.display_list = None
+        self.content = self.width = None
+        self.memory = 0
+
+
+def tabs_to_discard(tabs, active, budget, shared=0):
+    """
+    Background tabs to discard, least recently shown first, until the
+    estimated memory of the loaded tabs plus the shared caches fits the
+    budget. The active tab and tabs still loading are never chosen.
+    """
+    total = shared + sum(tab.memory for tab in tabs if tab.loaded)
+    discards = []
+    candidates = sorted((tab for tab in tabs if tab is not active and tab.loaded and not tab.loading),
+                        key=lambda tab: tab.last_active)
+    for tab in candidates:
+        if total <= budget:
+            break
+        discards.append(tab)
+        total -= tab.memory
+    return discards
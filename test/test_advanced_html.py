@@ -113,9 +113,32 @@ def test_mis_nested_formatting():
     print("Result Tree:")
     print_tree(root)
 
+def test_pretokenized_text():
+    """Test that text nodes carry their whitespace-split words from parsing."""
+    print("\n=== Testing Pre-tokenized Text ===")
+    root = HTMLParser("<p>  one two\n\tone  </p><p>two</p>").parse()
+    first = root.children[0].children[0].children[0]
+    second = root.children[0].children[1].children[0]
+    print(f"Words: {first.words} {second.words}")
+    assert first.words == ("one", "two", "one")
+    # Repeated words share one interned string.
+    assert first.words[0] is first.words[2]
+    assert first.words[1] is second.words[0]
+    # Changing the text re-tokenizes it.
+    first.text = "changed text"
+    assert first.words == ("changed", "text")
+
 def test_view_source():
-    """Test the view-source protocol (manual verification only)."""
+    """Test the view-source tokenizer; rendering is verified manually."""
     print("\n=== Testing View-Source Protocol ===")
+    from view_source import source_runs
+    html = "<!DOCTYPE html>\n<p class='a'>Text <!-- note --> more</p><b"
+    runs = list(source_runs(html))
+    for text, kind in runs:
+        print(f"{kind.upper()}: {text!r}")
+    # Runs must cover the source exactly, with nothing added or dropped.
+    assert "".join(text for text, kind in runs) == html
+    assert [kind for text, kind in runs] == ["tag", "text", "tag", "text", "comment", "text", "tag", "tag"]
     print("To test view-source, run the browser with a URL like:")
     print("python main.py view-source:http://example.com")
     print("or")
@@ -125,4 +148,5 @@ if __name__ == "__main__":
     test_script_handling()
     test_quoted_attributes()
     test_mis_nested_formatting()
+    test_pretokenized_text()
     test_view_source() 
\ No newline at end of file
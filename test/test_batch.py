@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# test_batch.py - Test the multi-process batch parsing mode
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from batch import expand_inputs, parse_one, record_json, run_batch, serialize_tree, tree_json, tree_stats
+from html_parser import HTMLParser
+
+def test_tree_stats():
+    """Test node counting and depth on a small tree."""
+    print("\n=== Testing Tree Stats ===")
+    root = HTMLParser("<p>Hello <b>world</b></p>").parse()
+    count, depth = tree_stats(root)
+    print(f"Nodes: {count}, depth: {depth}")
+    # html > body > p > (Text, b > Text)
+    assert count == 6
+    assert depth == 5
+
+def test_expand_and_parse():
+    """Test that directories, globs and URL lists expand and parse in a worker pool."""
+    print("\n=== Testing Batch Parsing ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(5):
+            with open(os.path.join(tmp, f"page{i}.html"), "w", encoding="utf-8") as f:
+                f.write(f"<p>Page {i}</p>" * (i + 1))
+        list_file = os.path.join(tmp, "urls.txt")
+        with open(list_file, "w", encoding="utf-8") as f:
+            f.write("data:text/html,<b>inline</b>\n")
+
+        from_dir = list(expand_inputs([tmp]))
+        from_glob = list(expand_inputs([os.path.join(tmp, "*.html")]))
+        from_list = list(expand_inputs(["@" + list_file]))
+        print(f"Directory: {len(from_dir)}, glob: {len(from_glob)}, list: {from_list}")
+        assert from_dir == from_glob
+        assert len(from_dir) == 5
+        assert from_list == ["data:text/html,<b>inline</b>"]
+
+        single = parse_one(from_dir[0], emit_tree=True)
+        print("Single result:", single)
+        assert single["bytes"] == len("<p>Page 0</p>")
+        assert single["tree"]["tag"] == "html"
+
+        results = list(run_batch(from_dir, workers=2, chunk_size=2))
+        assert sorted(r["source"] for r in results) == from_dir
+        assert all("error" not in r for r in results)
+        for r in sorted(results, key=lambda r: r["source"]):
+            print(r)
+
+def test_deep_tree():
+    """Test that deeply nested documents serialize and travel back from workers without recursing."""
+    print("\n=== Testing Deep Tree Output ===")
+    root = HTMLParser("<p class=a>Hello <b>world</b></p><br>").parse()
+    assert tree_json(root) == json.dumps(serialize_tree(root))
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as f:
+        f.write("<div>" * 600 + "deep" + "</div>" * 600)
+    try:
+        assert serialize_tree(HTMLParser("<div>" * 600).parse())["tag"] == "html"
+        [result] = run_batch([f.name], workers=1, emit_tree=True)
+    finally:
+        os.unlink(f.name)
+    line = record_json(result)
+    print(line[:120], "...")
+    assert "error" not in result and result["depth"] > 600
+    assert line.startswith(f'{{"source": {json.dumps(f.name)}') and line.count('"tag": "div"') == 600
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = f"<p>Page {self.path}</p>".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_pages():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+def run_cli(args):
+    """Run a batch CLI in a fresh interpreter; returns its stdout lines."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    done = subprocess.run([sys.executable] + args, cwd=root, capture_output=True, text=True, timeout=60)
+    assert done.returncode == 0, done.stderr
+    return done.stdout.splitlines()
+
+def test_http_output_is_json_lines():
+    """Test that connection logging from http fetches stays out of the JSON-lines output."""
+    print("\n=== Testing Batch Output Over HTTP ===")
+    server, base = serve_pages()
+    try:
+        lines = run_cli(["html_parser.py", "--batch", base + "/a", base + "/b", base + "/a",
+                         "--workers", "1"])
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(lines)
+    records = [json.loads(line) for line in lines]
+    assert len(records) == 3 and all("error" not in record for record in records)
+
+if __name__ == "__main__":
+    test_tree_stats()
+    test_expand_and_parse()
+    test_deep_tree()
+    test_http_output_is_json_lines()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# test_batch_render.py - Test the headless batch render mode
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from batch import expand_inputs
+from batch_render import percentile, render_one, run_render_batch, summarize
+from font_metrics import HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import Layout
+from style import compute_styles
+
+PAGE = "<html><body>" + "<p>Some <b>bold</b> and plain words</p>" * 50 + "</body></html>"
+
+def test_render_one():
+    """Test that a rendered record matches a direct headless layout, and that timeouts are reported."""
+    print("\n=== Testing Render One ===")
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as f:
+        f.write(PAGE * 20)
+    try:
+        result = render_one(f.name, width=400, emit_display_list=True)
+        print({key: value for key, value in result.items() if key != "display_list"})
+        root = HTMLParser(PAGE * 20).parse()
+        compute_styles(root)
+        expected = Layout(root, 400, HeadlessFontMetrics()).display_list
+        assert result["entries"] == len(expected) and result["height"] == expected.height
+        assert result["display_list"]["texts"] == expected.texts
+        assert set(result["times"]) == {"fetch", "parse", "style", "layout"}
+        slow = render_one(f.name, width=400, timeout=0.001)
+        print(slow)
+        assert slow["timeout"] and "error" in slow
+    finally:
+        os.unlink(f.name)
+    missing = render_one(os.path.join(tempfile.gettempdir(), "no-such-page.html"))
+    assert missing["error"].startswith("FileNotFoundError")
+
+class SlowError(Exception):
+    def __str__(self):
+        time.sleep(0.3)  # Outlasts the timeout while render_one formats the error
+        return "slow to describe"
+
+def test_timeout_after_render():
+    """Test that the timer cannot fire once the document has been rendered or has failed."""
+    print("\n=== Testing Late Timeouts ===")
+    import batch_render
+    saved = batch_render.render_document
+
+    def failing(location, width, result):
+        raise SlowError()
+
+    batch_render.render_document = failing
+    try:
+        result = render_one("page.html", timeout=0.1)
+    finally:
+        batch_render.render_document = saved
+    print(result)
+    assert result["error"] == "SlowError: slow to describe" and "timeout" not in result
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Keep-alive server whose /slow page stalls halfway through its body."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = (b"<p>SLOW PAGE</p>" if self.path == "/slow" else b"<p>fast page</p>") * 1000
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if self.path == "/slow":
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            time.sleep(1)
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def test_timeout_drops_connection():
+    """Test that a fetch interrupted by the timeout does not poison later fetches from the host."""
+    print("\n=== Testing Timeout Connection Cleanup ===")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address
+        base = f"http://{host}:{port}"
+        assert "error" not in render_one(base + "/fast")  # Leaves a pooled keep-alive connection
+        slow = render_one(base + "/slow", timeout=0.2)
+        print(slow)
+        assert slow.get("timeout")
+        fast = render_one(base + "/fast")
+        print(fast)
+        assert "error" not in fast and fast["entries"] > 0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_http_output_is_json_lines():
+    """Test that every stdout line of an http render run is a JSON record."""
+    print("\n=== Testing Render Output Over HTTP ===")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        host, port = server.server_address
+        done = subprocess.run([sys.executable, "batch_render.py", f"http://{host}:{port}/fast",
+                               f"http://{host}:{port}/fast", "--workers", "1"],
+                              cwd=root, capture_output=True, text=True, timeout=60)
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(done.stdout)
+    assert done.returncode == 0, done.stderr
+    records = [json.loads(line) for line in done.stdout.splitlines()]
+    assert len(records) == 2 and all("error" not in record for record in records)
+
+def test_pool_and_layout_cache():
+    """Test rendering in a worker pool, with the second run served from the on-disk layout cache."""
+    print("\n=== Testing Pool And Layout Cache ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(4):
+            with open(os.path.join(tmp, f"page{i}.html"), "w", encoding="utf-8") as f:
+                f.write(PAGE + f"<p>Page {i}</p>")
+        cache_dir = os.path.join(tmp, "cache")
+        first = list(run_render_batch(expand_inputs([tmp]), workers=2, chunk_size=1, cache_dir=cache_dir))
+        second = list(run_render_batch(expand_inputs([tmp]), workers=2, chunk_size=2, cache_dir=cache_dir))
+    print(summarize(second, 1.0))
+    assert len(first) == len(second) == 4
+    assert not any("error" in result or result.get("cached") for result in first)
+    assert all(result.get("cached") for result in second)
+    entries = {result["source"]: result["entries"] for result in first}
+    assert all(entries[result["source"]] == result["entries"] for result in second)
+
+def test_percentiles():
+    """Test nearest-rank percentiles and the run summary."""
+    print("\n=== Testing Percentiles ===")
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.5
+    assert percentile(values, 99) == 0.99
+    assert percentile([], 50) == 0.0
+    summary = summarize([{"total": 0.1, "bytes": 10}, {"total": 0.3, "bytes": 30},
+                         {"total": 5.0, "error": "timeout", "timeout": True}], 2.0)
+    print(summary)
+    assert summary["documents"] == 3 and summary["timeouts"] == 1
+    assert summary["p50"] == 0.1 and summary["max"] == 0.3
+    assert summary["docs_per_second"] == 1.5 and summary["bytes_per_second"] == 20
+
+if __name__ == "__main__":
+    test_render_one()
+    test_timeout_after_render()
+    test_timeout_drops_connection()
+    test_http_output_is_json_lines()
+    test_pool_and_layout_cache()
+    test_percentiles()
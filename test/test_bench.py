@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# test_bench.py - Test the benchmark corpora, runner and baseline comparison
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+import bench
+from font_metrics import HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import Layout
+from style import compute_styles
+
+def depth(node):
+    deepest = 0
+    stack = [(node, 1)]
+    while stack:
+        node, level = stack.pop()
+        deepest = max(deepest, level)
+        stack.extend((child, level + 1) for child in node.children)
+    return deepest
+
+def test_corpora():
+    """Test that every corpus is deterministic, near its size, lays out, and keeps a fixed depth."""
+    print("\n=== Testing Benchmark Corpora ===")
+    for kind in bench.CORPORA:
+        html = bench.make_corpus(kind, 4096)
+        print(f"{kind}: {len(html)} bytes")
+        assert html == bench.make_corpus(kind, 4096)
+        assert 4096 <= len(html) < 4096 * 3
+        root = HTMLParser(html).parse()
+        compute_styles(root)
+        Layout(root, bench.WIDTH, HeadlessFontMetrics())
+        # Depth must not grow with size, or large corpora overflow the stack.
+        assert depth(HTMLParser(bench.make_corpus(kind, 4096 * 8)).parse()) == depth(root), kind
+
+def test_run_and_compare():
+    """Test a tiny run, including fetches from the local server, against a baseline."""
+    print("\n=== Testing Benchmark Run ===")
+    bench.SIZES["tiny"] = 2048
+    try:
+        results = bench.run_benchmarks(["article"], ["tiny"], list(bench.BENCHMARKS), repeat=1)
+        # A benchmark that raises is recorded as failed and the run goes on.
+        bench.BENCHMARKS["broken"] = (lambda corpus: corpus.body, lambda body: 1 / 0)
+        partial = bench.run_benchmarks(["article"], ["tiny"], ["broken", "parse"], repeat=1)
+    finally:
+        del bench.SIZES["tiny"]
+        bench.BENCHMARKS.pop("broken", None)
+    print(sorted(results))
+    assert partial["article/tiny/broken"]["error"].startswith("ZeroDivisionError")
+    assert partial["article/tiny/parse"]["min"] >= 0
+    assert [row[4] for row in bench.compare(partial, results) if row[0].endswith("broken")] == ["failed"]
+    assert len(results) == len(bench.BENCHMARKS)
+    assert all(result["min"] >= 0 for result in results.values())
+    fast = {name: dict(result, min=0.0) for name, result in results.items()}
+    slow = {name: dict(result, min=1.0) for name, result in results.items()}
+    statuses = {row[4] for row in bench.compare(slow, fast)}
+    assert statuses == {"regressed"}
+    assert {row[4] for row in bench.compare(fast, slow)} == {"improved"}
+    assert {row[4] for row in bench.compare(slow, slow)} == {"ok"}
+    assert {row[4] for row in bench.compare(slow, {})} == {"new"}
+
+def test_startup_imports():
+    """Test that the URL and parser paths start without Tk, TLS, gzip, sockets or NumPy."""
+    print("\n=== Testing Startup Imports ===")
+    for path_name in ("url", "parser"):
+        times, modules = bench.time_startup(bench.STARTUP_PATHS[path_name], 1)
+        print(f"{path_name}: {times[0] * 1000:.1f} ms, heavy modules: {modules}")
+        assert modules == []
+    times, modules = bench.time_startup(bench.STARTUP_PATHS["browser"], 1)
+    assert "tkinter" in modules
+
+if __name__ == "__main__":
+    test_corpora()
+    test_run_and_compare()
+    test_startup_imports()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# test_display_list.py - Test the array-backed display list
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from display_list import DisplayList
+
+def test_sorted_columns():
+    """Test that entries are sorted by y and fonts/colors are interned."""
+    print("\n=== Testing Display List Columns ===")
+    font = ("Helvetica", 12)
+    bold = ("Helvetica", 12, "bold")
+    entries = [(13, 40, "c", font, False, "black"),
+               (13, 20, "a", bold, False, "black"),
+               (60, 20, "b", font, False, "blue")]
+    display_list = DisplayList(entries)
+    for entry in display_list:
+        print(entry)
+    assert [text for x, y, text, f, is_emoji, color in display_list] == ["a", "b", "c"]
+    assert len(display_list.fonts) == 2
+    assert display_list.colors == ["black", "blue"]
+    assert display_list.height == 40
+    assert display_list[-1] == entries[0]
+
+def test_visible_range():
+    """Test that visible() returns exactly the entries inside the y range."""
+    print("\n=== Testing Visible Range ===")
+    font = ("Helvetica", 12)
+    display_list = DisplayList((13, y, str(y), font, False, "black") for y in range(0, 10000, 20))
+    visible = list(display_list.visible(1000, 1100))
+    print([text for x, y, text, f, is_emoji, color in visible])
+    assert [y for x, y, text, f, is_emoji, color in visible] == list(range(1000, 1101, 20))
+    assert list(DisplayList().visible(0, 100)) == []
+    assert DisplayList().height == 0
+
+if __name__ == "__main__":
+    test_sorted_columns()
+    test_visible_range()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# test_history.py - Test session history and the back/forward page cache
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from history import CachedPage, History, PageCache
+from url import URL
+
+def page(memory):
+    return CachedPage(None, None, None, None, None, 0, memory)
+
+def test_history():
+    """Test back, forward, and that visiting drops the forward entries."""
+    print("\n=== Testing History ===")
+    history = History(URL("about:blank"))
+    first = history.current
+    history.visit(URL("http://example.org/a"))
+    history.visit(URL("http://example.org/b"))
+    assert history.go(-2) is first
+    assert not history.can_go(-1)
+    assert history.go(1).url.path == "/a"
+    dropped = history.visit(URL("http://example.org/c"))
+    print(history.entries)
+    assert [entry.url.path for entry in dropped] == ["/b"]
+    assert not history.can_go(1)
+    assert len(history.entries) == 3
+
+def test_page_cache_eviction():
+    """Test that the page cache is bounded by page count and by bytes."""
+    print("\n=== Testing Page Cache ===")
+    history = History(URL("about:blank"))
+    entries = [history.current]
+    for i in range(5):
+        history.visit(URL("about:blank"))
+        entries.append(history.current)
+    cache = PageCache(max_pages=3, max_bytes=1000)
+    for entry in entries[:4]:
+        cache.put(entry, page(100))
+    # Oldest goes first when the count is exceeded.
+    assert list(cache.pages) == entries[1:4]
+    cache.put(entries[4], page(800))
+    print(cache.stats())
+    assert cache.bytes <= 1000 and entries[4] in cache.pages
+    assert cache.take(entries[4]).memory == 800
+    assert cache.take(entries[4]) is None
+    # A page bigger than the whole cache is not kept.
+    cache.put(entries[5], page(5000))
+    assert entries[5] not in cache.pages
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+if __name__ == "__main__":
+    test_history()
+    test_page_cache_eviction()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# test_layout.py - Test layout with the headless font metrics backend
+
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+import bench
+import parallel_layout
+from font_metrics import HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import Layout, HSTEP
+from style import compute_styles
+
+def print_display_list(display_list):
+    for x, y, text, font, is_emoji, color in display_list:
+        print(f"({x}, {y}) {text!r} {font} {color}")
+
+def test_headless_layout():
+    """Test that layout runs without Tk and is deterministic."""
+    print("\n=== Testing Headless Layout ===")
+    html = "<p>Hello <b>bold</b> and <i>italic</i> words</p>"
+    root = HTMLParser(html).parse()
+    first = Layout(root, 400, HeadlessFontMetrics()).display_list
+    second = Layout(root, 400, HeadlessFontMetrics()).display_list
+    print_display_list(first)
+    assert first == second
+    assert [text for x, y, text, font, is_emoji, color in first] == \
+        ["Hello", "bold", "and", "italic", "words"]
+    # All words fit on one line, so they share a baseline-aligned row.
+    assert len({y for x, y, text, font, is_emoji, color in first}) == 1
+    assert first[0][0] == HSTEP
+
+def test_line_wrapping():
+    """Test that words wrap at the window width and center under <h1>."""
+    print("\n=== Testing Line Wrapping ===")
+    metrics = HeadlessFontMetrics()
+    root = HTMLParser("<p>" + "word " * 50 + "</p>").parse()
+    display_list = Layout(root, 200, metrics).display_list
+    rows = sorted({y for x, y, text, font, is_emoji, color in display_list})
+    print(f"{len(display_list)} words on {len(rows)} lines")
+    assert len(display_list) == 50
+    assert len(rows) > 1
+    for x, y, text, font, is_emoji, color in display_list:
+        assert x + metrics.measure((12, "normal", "roman", None), text) <= 200 - HSTEP
+
+    heading = Layout(HTMLParser("<h1>Title</h1>").parse(), 400, metrics).display_list
+    print_display_list(heading)
+    assert heading[0][0] > HSTEP
+
+def test_measure_cache():
+    """Test that repeated words are served from the measurement cache."""
+    print("\n=== Testing Measurement Cache ===")
+    metrics = HeadlessFontMetrics()
+    Layout(HTMLParser("<p>" + "same " * 100 + "</p>").parse(), 400, metrics)
+    stats = metrics.cache.stats()
+    print(stats)
+    assert stats["hit_rate"] > 0.9
+    assert stats["entries"] == 1
+
+class CountingMetrics(HeadlessFontMetrics):
+    """Headless metrics that count how often each font is created."""
+
+    def __init__(self):
+        super().__init__()
+        self.created = {}
+
+    def create_info(self, size, weight, style, family):
+        key = (size, weight, style, family)
+        self.created[key] = self.created.get(key, 0) + 1
+        return super().create_info(size, weight, style, family)
+
+def test_font_info_cache():
+    """Test that each font is created once and line metrics come from the fonts on the line."""
+    print("\n=== Testing Font Info Cache ===")
+    metrics = CountingMetrics()
+    words = "plain <b>bold</b> <i>italic</i> <big>big</big> <small>small</small> <b><i>both</i></b> "
+    layout = Layout(HTMLParser("<p>" + words * 200 + "</p>").parse(), 300, metrics)
+    for width in (150, 600, 300):
+        layout.reflow(width)
+    print(metrics.created)
+    assert len(metrics.created) >= 5
+    assert set(metrics.created.values()) == {1}
+    # Every word sits on its line's baseline; consecutive baselines are apart by
+    # the largest descent of the upper line plus the largest ascent of the lower one.
+    infos = {id(info.font): info for info in metrics.fonts.values()}
+    lines = {}
+    for x, y, text, font, is_emoji, color in layout.display_list:
+        info = infos[id(font)]
+        lines.setdefault(y + info.ascent, []).append(info)
+    baselines = sorted(lines)
+    assert len(baselines) > 10
+    for upper, lower in zip(baselines, baselines[1:]):
+        gap = int(1.25 * max(info.descent for info in lines[upper])) + \
+            int(1.25 * max(info.ascent for info in lines[lower]))
+        assert lower - upper == gap
+
+def test_reflow():
+    """Test that reflowing measured runs matches a fresh layout at the new width."""
+    print("\n=== Testing Reflow ===")
+    metrics = HeadlessFontMetrics()
+    root = HTMLParser("<h1>A heading</h1><p>" + "some longer words here " * 30 + "</p>").parse()
+    layout = Layout(root, 600, metrics)
+    misses = metrics.cache.misses
+    for width in (250, 400, 600):
+        reflowed = layout.reflow(width)
+        print(f"Width {width}: {len(reflowed)} entries")
+        assert reflowed == Layout(root, width, metrics).display_list
+    # Reflowing never measures text again.
+    assert metrics.cache.misses == misses
+
+def test_block_boxes():
+    """Test that block elements start new lines and get their own boxes."""
+    print("\n=== Testing Block Boxes ===")
+    layout = Layout(HTMLParser("<p>one</p><p>two</p>").parse(), 400, HeadlessFontMetrics())
+    print_display_list(layout.display_list)
+    (x1, y1, *rest1), (x2, y2, *rest2) = layout.display_list
+    assert x1 == x2 == HSTEP
+    assert y2 > y1
+
+def test_dirty_update():
+    """Test that only the changed subtree is rebuilt and unchanged lines are reused."""
+    print("\n=== Testing Dirty Flags ===")
+    metrics = HeadlessFontMetrics()
+    root = HTMLParser("<p>short</p><div>" + "long text " * 40 + "</div><p>tail</p>").parse()
+    layout = Layout(root, 500, metrics)
+    body = root.children[0]
+    first, long_div, last = [layout.boxes[node] for node in body.children]
+    short_lines = first.children[0].xs
+
+    # A narrower window rewraps the long block but reuses the short ones.
+    layout.reflow(300)
+    assert first.children[0].xs is short_lines
+    assert layout.display_list == Layout(root, 300, metrics).display_list
+
+    # Editing one paragraph rebuilds only that block.
+    long_lines = long_div.children[0].xs
+    first.node.children[0].text = "a much longer first paragraph"
+    layout.mark_dirty(first.node.children[0])
+    layout.update()
+    print_display_list(layout.display_list[:5])
+    assert long_div.children[0].xs is long_lines
+    assert layout.display_list == Layout(root, 300, metrics).display_list
+
+def test_vectorized_line_breaking():
+    """Test that the NumPy line breaker (when installed) matches the pure-Python one."""
+    print("\n=== Testing Vectorized Line Breaking ===")
+    import layout
+    html = "<h1>Centered heading text</h1><p>" + "words of <b>varying</b> <big>size</big> " * 60 + "</p>"
+    root = HTMLParser(html).parse()
+    fast = [list(Layout(root, width, HeadlessFontMetrics()).display_list) for width in (120, 400, 900)]
+    print(f"NumPy available: {layout.numpy is not None}")
+    saved = layout.numpy
+    layout.numpy = None
+    try:
+        slow = [list(Layout(root, width, HeadlessFontMetrics()).display_list) for width in (120, 400, 900)]
+    finally:
+        layout.numpy = saved
+    assert fast == slow
+
+def test_parallel_layout():
+    """Test that laying out blocks in worker processes matches the serial path."""
+    print("\n=== Testing Parallel Layout ===")
+    section = "<div><h1>Part</h1><p>" + "text with <b>bold</b> and <i>italic</i> " * 20 + "</p>loose <big>words</big></div>"
+    root = HTMLParser("<title>Doc</title>" + section * 12).parse()
+    serial = Layout(root, 500, HeadlessFontMetrics())
+    metrics = HeadlessFontMetrics()
+    # Layout(workers=N) only goes parallel with several CPUs; force the pool here.
+    parallel = Layout(root, 500, metrics, defer=True)
+    compute_styles(root)
+    parallel_layout.build_parallel(parallel, 2)
+    parallel.reflow(500)
+    print(f"{len(serial.display_list)} entries, {len(parallel.boxes)} block boxes")
+    assert list(parallel.display_list) == list(serial.display_list)
+    assert set(parallel.boxes) == set(serial.boxes)
+    # Worker fonts are swapped for the parent's own, so the font table stays small.
+    assert len(parallel.display_list.fonts) == len(serial.display_list.fonts)
+    own = {id(info.font) for info in metrics.fonts.values()}
+    assert all(id(font) in own for font in parallel.display_list.fonts)
+    assert list(parallel.reflow(300)) == list(serial.reflow(300))
+    assert len(parallel.display_list.fonts) == len(serial.display_list.fonts)
+
+def test_parallel_layout_cost():
+    """Test that a parallel build splits a page into few units and spares the parent's CPU."""
+    print("\n=== Testing Parallel Layout Cost ===")
+    workers = 4
+    root = HTMLParser(bench.make_corpus("article", 1_000_000)).parse()
+    compute_styles(root)
+    start, cpu = time.perf_counter(), time.thread_time()
+    serial = Layout(root, 500, HeadlessFontMetrics())
+    serial_wall, serial_cpu = time.perf_counter() - start, time.thread_time() - cpu
+
+    planned = Layout(root, 500, HeadlessFontMetrics(), defer=True)
+    sizes, blocks = parallel_layout.index_tree(root)
+    units, containers = parallel_layout.plan(planned, sizes, sizes[root] // (workers * parallel_layout.SPLIT_FACTOR))
+    assert workers <= len(units) <= 2 * workers * parallel_layout.SPLIT_FACTOR
+
+    parallel = Layout(root, 500, HeadlessFontMetrics(), defer=True)
+    start, cpu = time.perf_counter(), time.thread_time()
+    compute_styles(root)
+    parallel_layout.build_parallel(parallel, workers)
+    parallel.reflow(500)
+    wall, parent_cpu = time.perf_counter() - start, time.thread_time() - cpu
+    print(f"{len(units)} units; serial {serial_wall:.2f}s wall {serial_cpu:.2f}s CPU, "
+          f"parallel {wall:.2f}s wall {parent_cpu:.2f}s parent CPU")
+    assert list(parallel.display_list) == list(serial.display_list)
+    # The parent only plans, stitches and paints; the line breaking happens in the workers.
+    assert parent_cpu < serial_cpu / 2
+    if parallel_layout.available_cpus() > 1:
+        assert wall < serial_wall
+
+def test_build_steps():
+    """Test that building in steps, painting in between, ends with the serial result."""
+    print("\n=== Testing Incremental Build ===")
+    section = "<div><h1>Part</h1><p>" + "text with <b>bold</b> words " * 10 + "</p>loose <big>words</big></div>"
+    root = HTMLParser(section * 8).parse()
+    serial = Layout(root, 500, HeadlessFontMetrics())
+    compute_styles(root)
+    streamed = Layout(root, 500, HeadlessFontMetrics(), defer=True)
+    heights = []
+    for step, _ in enumerate(streamed.build_steps()):
+        if step % 5 == 0:
+            heights.append(streamed.reflow(500).height)
+    print(f"Painted {len(heights)} times while building; heights {heights[:6]}...")
+    assert heights == sorted(heights) and heights[-1] > heights[0]
+    assert list(streamed.reflow(500)) == list(serial.display_list)
+    assert set(streamed.boxes) == set(serial.boxes)
+
+def test_reflow_tail():
+    """Test that painting only new boxes while building matches a full reflow."""
+    print("\n=== Testing Tail Reflow ===")
+    section = "<div><h1>Part</h1><p>" + "text with <b>bold</b> words " * 10 + "</p><div>loose <big>words</big></div></div>"
+    root = HTMLParser(section * 8).parse()
+    compute_styles(root)
+    streamed = Layout(root, 500, HeadlessFontMetrics(), defer=True)
+    display_list = streamed.reflow_tail(500)
+    sizes = []
+    for step, _ in enumerate(streamed.build_steps()):
+        if step % 3 == 0:
+            # The same list grows, and what it holds is a full reflow's prefix.
+            assert streamed.reflow_tail(500) is display_list
+            sizes.append(len(display_list))
+            assert list(display_list) == list(streamed.reflow(500))[:len(display_list)]
+            display_list = streamed.reflow_tail(500)
+    print(f"Painted {len(sizes)} times while building; sizes {sizes[:6]}...")
+    assert sizes == sorted(sizes) and sizes[-1] > sizes[0]
+    assert list(streamed.reflow_tail(500)) == list(Layout(root, 500, HeadlessFontMetrics()).display_list)
+    # A new width paints everything again.
+    assert list(streamed.reflow_tail(300)) == list(streamed.reflow(300))
+
+def test_deep_nesting():
+    """Test that building, steps, reflow and updates handle nesting far past the recursion limit."""
+    print("\n=== Testing Deep Nesting ===")
+    depth = sys.getrecursionlimit() * 3
+    html = "<div>a " * depth + "<span>b " * depth + "end"
+    root = HTMLParser(html).parse()
+    layout = Layout(root, 400, HeadlessFontMetrics())
+    print(f"{len(layout.boxes)} block boxes, {len(layout.display_list)} entries")
+    assert len(layout.boxes) == depth + 2  # The divs, body and the root
+    assert [entry[2] for entry in layout.display_list][-3:] == ["b", "b", "end"]
+    assert len(layout.display_list) == 2 * depth + 1
+    streamed = Layout(root, 400, HeadlessFontMetrics(), defer=True)
+    for _ in streamed.build_steps():
+        pass
+    assert list(streamed.reflow(400)) == list(layout.display_list)
+    layout.mark_dirty(root.children[0])
+    assert list(layout.update()) == list(streamed.display_list)
+    assert list(layout.reflow(200)) == list(streamed.reflow(200))
+
+if __name__ == "__main__":
+    test_headless_layout()
+    test_line_wrapping()
+    test_measure_cache()
+    test_font_info_cache()
+    test_reflow()
+    test_block_boxes()
+    test_dirty_update()
+    test_vectorized_line_breaking()
+    test_parallel_layout()
+    test_parallel_layout_cost()
+    test_build_steps()
+    test_reflow_tail()
+    test_deep_nesting()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# test_layout_cache.py - Test the layout result cache and its on-disk form
+
+import os
+import pickle
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from font_metrics import DEFAULT_TABLES, HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import Layout
+from layout_cache import LayoutCache, content_key, dump, font_keys, load
+
+HTML = "<h1>Title</h1><p>Some <b>bold</b> and <i>italic</i> text " + "over and over " * 30 + "</p>"
+
+def test_memory_cache():
+    """Test lookups by content, width and font fingerprint, and count-based eviction."""
+    print("\n=== Testing Layout Cache ===")
+    metrics = HeadlessFontMetrics()
+    content = content_key(HTML)
+    cache = LayoutCache(max_entries=2)
+    display_list = Layout(HTMLParser(HTML).parse(), 400, metrics).display_list
+    cache.put(content, 400, metrics, display_list)
+    assert cache.get(content, 400, metrics) is display_list
+    assert cache.get(content, 500, metrics) is None
+    assert cache.get(content_key(HTML, "view-source"), 400, metrics) is None
+    # Different width tables mean different measurements, so no reuse.
+    wider = dict(DEFAULT_TABLES, monospace={"widths": {}, "default": 700})
+    assert cache.get(content, 400, HeadlessFontMetrics(wider)) is None
+    cache.put(content, 500, metrics, display_list)
+    cache.put(content, 600, metrics, display_list)
+    print(cache.stats())
+    assert cache.get(content, 400, metrics) is None
+    assert cache.stats()["entries"] == 2
+
+def test_disk_cache():
+    """Test that a second process-like cache finds layouts written by the first."""
+    print("\n=== Testing On-Disk Layout Cache ===")
+    metrics = HeadlessFontMetrics()
+    display_list = Layout(HTMLParser(HTML).parse(), 400, metrics).display_list
+    data = dump(display_list, metrics)
+    print(f"{len(display_list)} entries in {len(data)} bytes on disk")
+    assert list(load(data, HeadlessFontMetrics())) == list(display_list)
+    with tempfile.TemporaryDirectory() as directory:
+        LayoutCache(directory=directory).put(content_key(HTML), 400, metrics, display_list)
+        fresh = LayoutCache(directory=directory)
+        cached = fresh.get(content_key(HTML), 400, HeadlessFontMetrics())
+        assert cached is not None and list(cached) == list(display_list)
+        assert fresh.stats()["disk_hits"] == 1
+
+def test_copied_fonts():
+    """Test that layouts built in worker processes, or holding copied fonts, can be stored."""
+    print("\n=== Testing Layouts With Copied Fonts ===")
+    metrics = HeadlessFontMetrics()
+    display_list = Layout(HTMLParser(HTML).parse(), 400, metrics).display_list
+    copied = load(dump(display_list, metrics), HeadlessFontMetrics())
+    copied.fonts = pickle.loads(pickle.dumps(copied.fonts))
+    assert font_keys(copied, metrics) == font_keys(display_list, metrics)
+    root = HTMLParser(HTML * 20).parse()
+    parallel = Layout(root, 400, metrics, workers=2).display_list
+    with tempfile.TemporaryDirectory() as directory:
+        LayoutCache(directory=directory).put(content_key(HTML * 20), 400, metrics, parallel)
+        cached = LayoutCache(directory=directory).get(content_key(HTML * 20), 400, HeadlessFontMetrics())
+        assert cached is not None and list(cached) == list(parallel)
+
+if __name__ == "__main__":
+    test_memory_cache()
+    test_disk_cache()
+    test_copied_fonts()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# test_loader.py - Test the background page loader
+
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+import url
+from bench_server import BenchServer
+from loader import PageLoader
+from url import URL
+
+def page_url(html, prefix=""):
+    f = tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8")
+    with f:
+        f.write(html)
+    return URL(prefix + "file://" + f.name)
+
+def test_background_load():
+    """Test that the loader hands back the body and a styled tree from its thread."""
+    print("\n=== Testing Background Load ===")
+    loader = PageLoader(page_url("<p>Hello <b>world</b></p>")).start()
+    loader.thread.join()
+    os.unlink(loader.url.path)
+    stages = loader.poll()
+    print([(stage, round(elapsed, 4)) for stage, value, elapsed in stages])
+    assert [stage for stage, value, elapsed in stages] == ["body", "tree"]
+    tree = stages[1][1]
+    bold = tree.children[0].children[0].children[1]
+    assert bold.tag == "b" and bold.style.weight == "bold"
+    assert loader.poll() == []
+
+def test_view_source_load():
+    """Test that view-source pages stop after the body stage."""
+    print("\n=== Testing View-Source Load ===")
+    loader = PageLoader(page_url("<p>Hi</p>", "view-source:")).start()
+    loader.thread.join()
+    os.unlink(loader.url.path)
+    stages = loader.poll()
+    assert [(stage, value) for stage, value, elapsed in stages] == [("body", "<p>Hi</p>")]
+
+def test_concurrent_loads_same_host():
+    """Test that loads to one host on several threads never share a keep-alive socket."""
+    print("\n=== Testing Concurrent Loads ===")
+    pages = {name: f"<p>Page {name} " + name * 20000 + "</p>" for name in "abcd"}
+    with BenchServer() as server:
+        for name, html in pages.items():
+            server.add(name, html)
+        URL(server.url("plain", "a")).request()  # Warm the pool
+        loaders = [PageLoader(URL(server.url(mode, name))).start()
+                   for mode in ("plain", "chunked") for name in pages]
+        for loader in loaders:
+            loader.thread.join(10)
+            assert not loader.thread.is_alive(), "loader blocked on a shared socket"
+        for loader in loaders:
+            stages = {stage: value for stage, value, elapsed in loader.poll()}
+            assert "error" not in stages, stages.get("error")
+            name = loader.url.path.rsplit("/", 1)[1]
+            assert stages["body"] == pages[name]
+        # At most one idle connection per host is kept.
+        host, port = server.server_address
+        assert ("http", host, port) in url.connection_pool
+
+if __name__ == "__main__":
+    test_background_load()
+    test_view_source_load()
+    test_concurrent_loads_same_host()
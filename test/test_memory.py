@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# test_memory.py - Test memory estimates, per-stage peaks and soft limits
+
+import os
+import sys
+import tempfile
+import tracemalloc
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+import memory
+import url
+from font_metrics import HeadlessFontMetrics
+from history import CachedPage, History, PageCache
+from response_cache import ResponseCache
+
+def test_estimates():
+    """Test that a headless load attributes bytes to the DOM, layout, display list and fonts."""
+    print("\n=== Testing Estimates ===")
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as f:
+        f.write("<html><body>" + "<p>Some <b>bold</b> and plain words</p>" * 200 + "</body></html>")
+    metrics = HeadlessFontMetrics()
+    try:
+        tab = memory.load_headless("file://" + f.name, metrics)
+    finally:
+        os.unlink(f.name)
+    sizes = memory.estimate([tab], metrics=metrics)
+    print(sizes)
+    assert list(sizes) == list(memory.CATEGORIES)
+    for category in ("dom", "layout", "display_lists", "fonts", "measure_cache"):
+        assert sizes[category] > 0, category
+    assert sizes["display_lists"] == tab.display_list.nbytes()
+
+def test_stage_peaks():
+    """Test that stages record their peak only while tracemalloc is tracing."""
+    print("\n=== Testing Stage Peaks ===")
+    memory.STAGE_PEAKS.clear()
+    assert memory.track_stage("off") is memory.NULL_STAGE
+    tracemalloc.start()
+    try:
+        with memory.track_stage("outer"):
+            with memory.track_stage("inner"):
+                data = bytearray(1_000_000)
+            del data
+        report = memory.memory_report()
+    finally:
+        tracemalloc.stop()
+    stages = report["stages"]
+    print(stages)
+    assert "off" not in stages
+    # The inner peak still counts toward the stage enclosing it.
+    assert stages["inner"]["growth"] >= 1_000_000
+    assert stages["outer"]["growth"] >= 1_000_000
+    assert stages["outer"]["retained"] < 1_000_000
+    assert report["traced"]["peak"] >= report["traced"]["current"]
+
+def test_soft_limits():
+    """Test that caches over their soft limit are trimmed, oldest first."""
+    print("\n=== Testing Soft Limits ===")
+    saved = url.response_cache
+    url.response_cache = ResponseCache(compress=False)
+    try:
+        for i in range(10):
+            url.response_cache.put(f"http://example.org:80/{i}", "x" * 1000)
+        history = History(url.URL("about:blank"))
+        page_cache = PageCache()
+        for i in range(4):
+            page_cache.put(history.current, CachedPage(None, None, None, None, None, 0, 1000))
+            history.visit(url.URL("about:blank"))
+        limits = dict(map(memory.parse_limit, ["response_cache=5K", "page_cache=2500"]))
+        freed = memory.enforce_limits(limits, page_cache=page_cache)
+        print(freed)
+        assert memory.response_cache_bytes() <= 5 * 1024
+        assert "http://example.org:80/9" in url.response_cache
+        assert "http://example.org:80/0" not in url.response_cache
+        assert page_cache.bytes == 2000 and freed["page_cache"] == 2000
+        assert memory.enforce_limits(limits, page_cache=page_cache) == {}
+    finally:
+        url.response_cache = saved
+    try:
+        memory.enforce_limits({"fonts": 0})
+    except ValueError as e:
+        print(e)
+    else:
+        assert False, "fonts cannot be evicted"
+
+if __name__ == "__main__":
+    test_estimates()
+    test_stage_peaks()
+    test_soft_limits()
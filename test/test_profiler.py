@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# test_profiler.py - Test the pipeline tracer and its Chrome trace output
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+import profiler
+from profiler import NULL_SPAN, SAMPLE_TID_BASE, Tracer
+
+def test_spans_only_when_enabled():
+    """Test that spans are free no-ops until tracing starts, then record events."""
+    print("\n=== Testing Span Recording ===")
+    tracer = Tracer()
+    assert tracer.span("parse") is NULL_SPAN
+    with tracer.span("parse"):
+        pass
+    assert tracer.events == []
+    tracer.start()
+    with tracer.span("HTMLParser.parse", "parse", bytes=10):
+        pass
+    tracer.stop()
+    with tracer.span("after"):
+        pass
+    print(tracer.events)
+    assert [event["name"] for event in tracer.events] == ["HTMLParser.parse"]
+    event = tracer.events[0]
+    assert event["ph"] == "X" and event["cat"] == "parse" and event["args"] == {"bytes": 10}
+    assert event["ts"] >= 0 and event["dur"] >= 0
+
+def test_sample_events():
+    """Test that consecutive samples with a shared stack prefix merge into nested events."""
+    print("\n=== Testing Sample Merging ===")
+    tracer = Tracer()
+    tracer.origin = 0.0
+    tracer.samples = [
+        (0.0, 1, ("layout.layout", "layout.word")),
+        (0.0, 2, ("html_parser.parse",)),
+        (0.001, 1, ("layout.layout", "layout.word")),
+        (0.001, 2, ()),
+        (0.002, 1, ("layout.layout", "layout.flush")),
+        (0.003, 1, ()),
+    ]
+    all_events = tracer.sample_events()
+    events = sorted((event["name"], event["ts"], event["dur"]) for event in all_events
+                    if event["tid"] == SAMPLE_TID_BASE + tracer.tid(1))
+    print(events)
+    assert [name for name, ts, dur in events] == ["layout.flush", "layout.layout", "layout.word"]
+    assert round(events[1][2]) == 3000  # layout.layout spans all three samples
+    assert round(events[2][2]) == 2000
+    # The other thread's samples are merged on their own track.
+    other = [event for event in all_events if event["tid"] == SAMPLE_TID_BASE + tracer.tid(2)]
+    assert [(event["name"], round(event["dur"])) for event in other] == [("html_parser.parse", 1000)]
+    assert tracer.sample_summary()[0] == ("layout.word", 0.5)
+
+def test_profile_load_trace():
+    """Test that profiling a page load writes a valid Chrome trace with each stage."""
+    print("\n=== Testing Trace File ===")
+    with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as f:
+        f.write("<html><body><p>Hello <b>traced</b> world</p></body></html>")
+    trace_path = f.name + ".json"
+    try:
+        profiler.profile_load("file://" + f.name, trace_path, sample_interval=0.001)
+        with open(trace_path, encoding="utf-8") as trace_file:
+            trace = json.load(trace_file)
+    finally:
+        os.unlink(f.name)
+        if os.path.exists(trace_path):
+            os.unlink(trace_path)
+    names = {event["name"] for event in trace["traceEvents"] if event["ph"] == "X"}
+    print(sorted(names))
+    assert {"URL.request", "HTMLParser.parse", "compute_styles", "Layout", "Layout.reflow"} <= names
+    assert any(event["ph"] == "M" for event in trace["traceEvents"])
+    assert not profiler.TRACER.enabled
+
+def test_samples_every_thread():
+    """Test that the sampler records threads besides the main one, each on its own track."""
+    print("\n=== Testing Sampling Of Worker Threads ===")
+    from font_metrics import HeadlessFontMetrics
+    from html_parser import HTMLParser
+    from layout import Layout
+    body = "<p>" + "some words to lay out " * 2000 + "</p>"
+    done = threading.Event()
+
+    def work():
+        while not done.is_set():
+            Layout(HTMLParser(body).parse(), 400, HeadlessFontMetrics())
+
+    tracer = Tracer()
+    tracer.start(sample_interval=0.001)
+    worker = threading.Thread(target=work, name="loader")
+    worker.start()
+    deadline = time.perf_counter() + 5
+    while time.perf_counter() < deadline and not any(ident == worker.ident and stack
+                                                     for when, ident, stack in tracer.samples):
+        time.sleep(0.01)
+    done.set()
+    worker.join()
+    tracer.stop()
+    trace = tracer.trace()
+    track = SAMPLE_TID_BASE + tracer.tid(worker.ident)
+    names = {event["tid"]: event["args"]["name"] for event in trace["traceEvents"] if event["ph"] == "M"}
+    print(names)
+    assert names[track] == "samples: loader"
+    assert any(event["tid"] == track and event.get("cat") == "sample" for event in trace["traceEvents"])
+    assert threading.main_thread().ident in tracer.sampled_threads()
+
+if __name__ == "__main__":
+    test_spans_only_when_enabled()
+    test_sample_events()
+    test_samples_every_thread()
+    test_profile_load_trace()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# test_renderer.py - Test the retained canvas renderer without a display
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from display_list import DisplayList
+from renderer import RetainedRenderer
+
+class FakeCanvas:
+    """Records the canvas calls the renderer makes, in place of a Tk canvas."""
+
+    def __init__(self):
+        self.items = {}  # item id -> [x, y, text]
+        self.next_id = 1
+        self.created = 0
+        self.deleted = 0
+        self.moves = 0
+
+    def create_text(self, x, y, text, **options):
+        self.created += 1
+        item = self.next_id
+        self.next_id += 1
+        self.items[item] = [x, y, text]
+        return item
+
+    create_image = create_text
+
+    def create_rectangle(self, *coords, **options):
+        return self.create_text(coords[0], coords[1], "thumb")
+
+    def delete(self, item):
+        if item == "content":
+            self.items = {key: value for key, value in self.items.items() if value[2] == "thumb"}
+            return
+        self.deleted += 1
+        del self.items[item]
+
+    def move(self, tag, dx, dy):
+        self.moves += 1
+        for value in self.items.values():
+            if value[2] != "thumb":
+                value[0] += dx
+                value[1] += dy
+
+    def coords(self, item, *coords):
+        self.items[item][:2] = coords[:2]
+
+    def itemconfigure(self, item, **options):
+        pass
+
+    def tag_raise(self, item):
+        pass
+
+def test_scroll_reuses_items():
+    """Test that scrolling only creates and deletes items at the viewport edges."""
+    print("\n=== Testing Retained Rendering ===")
+    font = ("Helvetica", 12)
+    display_list = DisplayList((13, y, str(y), font, False, "black") for y in range(0, 10000, 20))
+    canvas = FakeCanvas()
+    renderer = RetainedRenderer(canvas, overscan=100)
+    renderer.set_display_list(display_list)
+    renderer.render(0, 800, 600)
+    first = canvas.created
+    print(f"First frame created {first} items")
+    renderer.render(20, 800, 600)
+    print(f"Scrolling one line created {canvas.created - first}, deleted {canvas.deleted}")
+    assert canvas.created - first == 1
+    assert canvas.moves == 1
+    # Every item sits at its display-list y minus the scroll offset.
+    for i, item in renderer.items.items():
+        x, y, text = canvas.items[item]
+        assert y == display_list.ys[i] - 20, (text, y)
+    # A jump far down replaces everything, and items still line up.
+    renderer.render(5000, 800, 600)
+    assert sorted(renderer.items) == list(display_list.index_range(4900, 5700))
+    for i, item in renderer.items.items():
+        assert canvas.items[item][1] == display_list.ys[i] - 5000
+    assert len(canvas.items) == len(renderer.items) + 1  # Plus the scrollbar thumb
+
+def test_growing_display_list():
+    """Test that entries appended to the drawn display list only add their own items."""
+    print("\n=== Testing A Growing Display List ===")
+    font = ("Helvetica", 12)
+    display_list = DisplayList((13, y, str(y), font, False, "black") for y in range(0, 300, 20))
+    canvas = FakeCanvas()
+    renderer = RetainedRenderer(canvas, overscan=100)
+    renderer.set_display_list(display_list)
+    renderer.render(0, 800, 600)
+    first = canvas.created
+    display_list.extend((13, y, str(y), font, False, "black") for y in range(300, 10000, 20))
+    renderer.render(0, 800, 600)
+    print(f"First frame created {first} items, the grown list {canvas.created - first} more")
+    # Plus the scrollbar thumb, now that the page is taller than the window.
+    assert canvas.created - first == len(display_list.index_range(300, 700)) + 1
+    assert canvas.deleted == 0
+    assert sorted(renderer.items) == list(display_list.index_range(-100, 700))
+
+if __name__ == "__main__":
+    test_scroll_reuses_items()
+    test_growing_display_list()
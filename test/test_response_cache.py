@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# test_response_cache.py - Test compressed storage in the HTTP response cache
+
+import gzip
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from response_cache import ResponseCache
+
+PAGE = "<p>Grüße aus dem Browser – ünïcödé text repeats well</p>\n" * 500
+
+def test_compressed_storage():
+    """Test that bodies are stored compressed, counted by stored size, and decoded on a hit."""
+    print("\n=== Testing Compressed Storage ===")
+    text = ResponseCache(compress=False)
+    compressed = ResponseCache()
+    for cache in (text, compressed):
+        cache.put("http://example.org:80/", PAGE, None, PAGE.encode("utf-8"), "identity")
+    print(text.stats())
+    print(compressed.stats())
+    assert compressed.entries["http://example.org:80/"].encoding == "zlib"
+    assert compressed.bytes * 5 < text.bytes
+    assert compressed.get("http://example.org:80/") == PAGE
+    assert text.get("http://example.org:80/") == PAGE
+    stats = compressed.stats()
+    assert stats["hits"] == 1 and stats["ratio"] > 5 and stats["decode_ms"] > 0
+    # A gzip body is kept exactly as the server sent it.
+    body = gzip.compress(PAGE.encode("utf-8"))
+    compressed.put("http://example.org:80/gz", PAGE, None, body, "gzip")
+    assert compressed.entries["http://example.org:80/gz"].body is body
+    assert compressed.get("http://example.org:80/gz") == PAGE
+    # Bodies that do not shrink are kept as plain UTF-8 bytes.
+    compressed.put("http://example.org:80/tiny", "ok")
+    assert compressed.entries["http://example.org:80/tiny"].encoding == "identity"
+    assert compressed.get("http://example.org:80/tiny") == "ok"
+
+def test_budget_and_expiry():
+    """Test LRU eviction by stored bytes, oversized bodies and expired entries."""
+    print("\n=== Testing Budget And Expiry ===")
+    one = ResponseCache(compress=False)
+    one.put("a", PAGE)
+    cache = ResponseCache(max_bytes=one.bytes * 2 + 100, compress=False)
+    cache.put("a", PAGE)
+    cache.put("b", PAGE)
+    assert cache.get("a") == PAGE  # "b" is now the least recently used
+    cache.put("c", PAGE)
+    print(cache.stats())
+    assert "b" not in cache and "a" in cache and "c" in cache
+    assert cache.stats()["evictions"] == 1
+    cache.put("huge", PAGE * 10)
+    assert "huge" not in cache
+    cache.put("old", "stale", expires=time.time() - 1)
+    assert cache.get("old") is None and "old" not in cache
+    assert cache.stats()["expired"] == 1
+    cache.trim(0)
+    assert len(cache) == 0 and cache.bytes == 0 and cache.text_bytes == 0
+
+if __name__ == "__main__":
+    test_compressed_storage()
+    test_budget_and_expiry()
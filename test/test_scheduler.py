@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# test_scheduler.py - Test the frame scheduler with a fake clock and event loop
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from scheduler import FrameScheduler
+
+class FakeLoop:
+    """Stands in for a Tk widget: queues callbacks and advances a fake clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.queue = []  # (due time, callback)
+
+    def clock(self):
+        return self.now
+
+    def after(self, ms, callback):
+        self.queue.append((self.now + ms / 1000, callback))
+        return len(self.queue)
+
+    def after_idle(self, callback):
+        return self.after(0, callback)
+
+    def run_due(self):
+        due = [entry for entry in self.queue if entry[0] <= self.now]
+        self.queue = [entry for entry in self.queue if entry[0] > self.now]
+        for when, callback in due:
+            callback()
+
+def test_coalescing():
+    """Test that a burst of requests produces one frame and counts the rest as dropped."""
+    print("\n=== Testing Frame Coalescing ===")
+    loop = FakeLoop()
+    drawn = []
+    scheduler = FrameScheduler(loop, lambda: drawn.append(loop.now), fps=50, clock=loop.clock)
+    for i in range(10):
+        scheduler.request()
+    loop.run_due()
+    print(scheduler.stats())
+    assert drawn == [0.0]
+    assert scheduler.stats()["dropped"] == 9
+    # A request right after a frame waits for the next frame slot.
+    scheduler.request()
+    loop.run_due()
+    assert len(drawn) == 1
+    loop.now = 0.02
+    loop.run_due()
+    assert drawn == [0.0, 0.02]
+    assert scheduler.stats()["frames"] == 2
+    assert scheduler.stats()["requests"] == 11
+
+def test_frame_budget():
+    """Test that frames slower than the budget are counted."""
+    print("\n=== Testing Frame Budget ===")
+    loop = FakeLoop()
+
+    def slow_draw():
+        loop.now += 0.05
+
+    scheduler = FrameScheduler(loop, slow_draw, fps=60, clock=loop.clock)
+    scheduler.request()
+    loop.run_due()
+    stats = scheduler.stats()
+    print(stats)
+    assert stats["over_budget"] == 1
+    assert round(stats["max_ms"]) == 50
+
+if __name__ == "__main__":
+    test_coalescing()
+    test_frame_budget()
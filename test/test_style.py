@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# test_style.py - Test the computed-style engine
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from html_parser import HTMLParser
+from style import DEFAULT_STYLE, StyleCache, compute_styles, parse_color, parse_inline_style
+
+def find(node, tag):
+    """Return all elements with the given tag, in document order."""
+    found = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if getattr(current, "tag", None) == tag:
+            found.append(current)
+        stack.extend(reversed(current.children))
+    return found
+
+def test_inheritance():
+    """Test tag defaults, inheritance and nested formatting tags."""
+    print("\n=== Testing Style Inheritance ===")
+    root = HTMLParser("<h1><b>Bold <b>still bold</b> after</b> <small><small>tiny</small></small></h1>").parse()
+    compute_styles(root, cache=StyleCache())
+    outer, inner = find(root, "b")[:2]
+    print("Outer <b>:", outer.style)
+    assert inner in outer.children
+    assert outer.style.weight == inner.style.weight == "bold"
+    assert outer.style.align == "center"
+    small, smaller = find(root, "small")[:2]
+    assert smaller in small.children
+    assert smaller.style.size == DEFAULT_STYLE.size - 4
+
+def test_inline_style():
+    """Test that inline style attributes are applied."""
+    print("\n=== Testing Inline Styles ===")
+    assert parse_inline_style("color: blue; font-weight:bold;") == {"color": "blue", "font-weight": "bold"}
+    root = HTMLParser("<p style='color:blue;font-size:24px;font-style:italic;font-weight:700'>x</p>").parse()
+    compute_styles(root, cache=StyleCache())
+    p = find(root, "p")[0]
+    print("Styled <p>:", p.style)
+    assert (p.style.color, p.style.size, p.style.style, p.style.weight) == ("blue", 18, "italic", "bold")
+
+def test_inline_colors():
+    """Test that inline colors are turned into ones Tk can draw, or inherited."""
+    print("\n=== Testing Inline Colors ===")
+    assert parse_color("Blue", "black") == "blue"
+    assert parse_color("#1A2b3C", "black") == "#1a2b3c"
+    assert parse_color("#11223380", "black") == "#112233"
+    assert parse_color("rgb(255, 0, 0)", "black") == "#ff0000"
+    assert parse_color("rgba(0 128 255 / 50%)", "black") == "#0080ff"
+    assert parse_color("rgb(100%, 0%, 300)", "black") == "#ff00ff"
+    assert parse_color("rebeccapurple", "black") == "#663399"
+    for value in ("inherit", "currentColor", "transparent", "rgba(0, 0, 0, 0)", "#12", "rgb(1, 2)",
+                  "hsl(0, 100%, 50%)", "var(--accent)", "notacolor"):
+        assert parse_color(value, "green") == "green", value
+    root = HTMLParser("<div style='color:rgb(0,0,255)'><p style='color:inherit'>a</p>"
+                      "<p style='color:bogus'>b</p></div>").parse()
+    compute_styles(root, cache=StyleCache())
+    print("Colors:", [p.style.color for p in find(root, "p")])
+    assert [p.style.color for p in find(root, "p")] == ["#0000ff", "#0000ff"]
+
+def test_style_sharing():
+    """Test that identical siblings share one computed-style object."""
+    print("\n=== Testing Style Sharing ===")
+    cache = StyleCache()
+    root = HTMLParser("<ul>" + "<li><i>item</i></li>" * 50 + "</ul>").parse()
+    compute_styles(root, cache=cache)
+    italics = find(root, "i")
+    print(cache.stats())
+    assert all(i.style is italics[0].style for i in italics)
+    assert cache.stats()["hit_rate"] > 0.9
+
+if __name__ == "__main__":
+    test_inheritance()
+    test_inline_style()
+    test_inline_colors()
+    test_style_sharing()
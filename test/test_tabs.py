@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# test_tabs.py - Test tab memory accounting and the discard policy
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add parent directory to path
+from font_metrics import HeadlessFontMetrics
+from html_parser import HTMLParser
+from layout import Layout
+from tabs import Tab, tabs_to_discard
+from url import URL
+
+def loaded_tab(html, last_active):
+    tab = Tab(URL("about:blank"))
+    tab.nodes = HTMLParser(html).parse()
+    tab.layout = Layout(tab.nodes, 600, HeadlessFontMetrics())
+    tab.display_list = tab.layout.display_list
+    tab.last_active = last_active
+    tab.measure_memory()
+    return tab
+
+def test_memory_estimate():
+    """Test that a document's estimate grows with its size."""
+    print("\n=== Testing Tab Memory Estimate ===")
+    small = loaded_tab("<p>" + "word " * 10 + "</p>", 1)
+    large = loaded_tab("<p>" + "word " * 1000 + "</p>", 2)
+    print(f"small: {small.memory} bytes, large: {large.memory} bytes")
+    assert 0 < small.memory < large.memory
+    large.scroll = 300
+    large.discard()
+    assert not large.loaded and large.memory == 0
+    assert large.scroll == 300 and large.url is not None
+
+def test_discard_policy():
+    """Test that the least recently shown background tabs are discarded first."""
+    print("\n=== Testing Discard Policy ===")
+    html = "<p>" + "word " * 200 + "</p>"
+    tabs = [loaded_tab(html, last_active) for last_active in (3, 1, 4, 2)]
+    active = tabs[3]
+    size = tabs[0].memory
+    assert tabs_to_discard(tabs, active, budget=size * 4) == []
+    # Room for two documents: the two oldest background tabs go.
+    discards = tabs_to_discard(tabs, active, budget=size * 2)
+    assert discards == [tabs[1], tabs[0]]
+    # The active tab is kept even when it alone is over budget.
+    assert active not in tabs_to_discard(tabs, active, budget=0)
+    # Shared cache bytes count against the same budget.
+    assert len(tabs_to_discard(tabs, active, budget=size * 4, shared=size)) == 1
+
+if __name__ == "__main__":
+    test_memory_estimate()
+    test_discard_policy()
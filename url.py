@@ -1,19 +1,36 @@
 # url.py
-import socket
-import ssl
 import os
-import urllib.parse
 import time
-import gzip
-import tkinter
 
-# Global connection pool for persistent connections.
+from response_cache import ResponseCache
+
+# socket, ssl, gzip, urllib.parse and tkinter are imported where they are
+# used, so file: and about: pages, the parser and headless workers never
+# pay for networking, TLS, decompression or Tk.
+
+# Global pool of idle persistent connections, one per (scheme, host, port).
+# A request takes its connection out of the pool and puts it back only after
+# reading the whole response, so loader threads never share a socket.
 connection_pool = {}
-# Global cache for HTTP responses: key -> (content, expire_time).
-response_cache = {}
+# Global cache for HTTP responses by canonical URL, stored compressed.
+response_cache = ResponseCache()
 # Global cache for emoji images.
 emoji_images = {}
 
+def release_connection(key, s):
+    """Return an idle connection to the pool, closing it if the host already has one."""
+    if connection_pool.setdefault(key, s) is not s:
+        s.close()
+
+def close_connections():
+    """Close and forget every idle pooled connection."""
+    while connection_pool:
+        try:
+            key, s = connection_pool.popitem()
+        except KeyError:  # Emptied by another thread meanwhile
+            break
+        s.close()
+
 def get_emoji_image(ch):
     """
     Given a character, if an emoji image exists for it in the 'emoji' folder,
@@ -29,6 +46,7 @@ def get_emoji_image(ch):
     code = f"{ord(ch):X}"
     path = os.path.join("emoji", code + ".png")
     if os.path.exists(path):
+        import tkinter
         img = tkinter.PhotoImage(file=path)
         emoji_images[ch] = img
         return img
@@ -61,6 +79,7 @@ class URL:
             if self.scheme == "data":
                 # data URL: data:[<mediatype>][;base64],<data>
                 meta, data = rest.split(",", 1)
+                import urllib.parse
                 self.data = urllib.parse.unquote(data)
                 return
             if self.scheme == "file":
@@ -92,11 +111,10 @@ class URL:
             return ""
         # Delegate view-source requests.
         if self.view_source:
-            # Get the original content
+            # Return the original content; the browser highlights it with
+            # view_source.SourceLayout instead of parsing generated markup.
             inner_url = URL(self.get_url_without_view_source())
-            content = inner_url.request(redirects_remaining)
-            # Return the syntax highlighted version
-            return self.highlight_html_source(content)
+            return inner_url.request(redirects_remaining)
         if self.scheme == "data":
             return self.data
         if self.scheme == "file":
@@ -106,28 +124,94 @@ class URL:
         # For HTTP/HTTPS, construct the canonical URL.
         canonical_url = f"{self.scheme}://{self.host}:{self.port}{self.path}"
         # Check the cache first.
-        if canonical_url in response_cache:
-            cached_content, expire_time = response_cache[canonical_url]
-            if expire_time is None or time.time() < expire_time:
-                print("Serving from cache")
-                return cached_content
-            else:
-                del response_cache[canonical_url]
+        cached_content = response_cache.get(canonical_url)
+        if cached_content is not None:
+            print("Serving from cache")
+            return cached_content
 
-        # Reuse or create a persistent connection.
+        # Take an idle persistent connection out of the pool, or create one.
         key = (self.scheme, self.host, self.port)
-        if key in connection_pool:
-            print(f"Reusing connection for {key} (socket id: {id(connection_pool[key])})")
-            s = connection_pool[key]
+        s = connection_pool.pop(key, None)
+        if s is not None:
+            print(f"Reusing connection for {key} (socket id: {id(s)})")
         else:
             print(f"Creating new connection for {key}")
+            import socket
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
             s.connect((self.host, self.port))
             if self.scheme == "https":
+                import ssl
                 ctx = ssl.create_default_context()
                 s = ctx.wrap_socket(s, server_hostname=self.host)
-            connection_pool[key] = s
+        try:
+            code, response_headers, body_bytes, reusable = self.exchange(s)
+        except BaseException:
+            # A half-read response would be parsed as the next request's
+            # status line, so the connection is never reused after an error.
+            s.close()
+            raise
+        if reusable:
+            release_connection(key, s)
+        else:
+            s.close()
+
+        # Handle redirects (status codes 300-399).
+        if 300 <= code < 400:
+            if redirects_remaining <= 0:
+                raise Exception("Too many redirects")
+            if "location" not in response_headers:
+                raise Exception("Redirect response missing Location header")
+            new_url = response_headers["location"]
+            if new_url.startswith("/"):
+                new_url = f"{self.scheme}://{self.host}{new_url}"
+            print(f"Redirecting to {new_url}")
+            return URL(new_url).request(redirects_remaining - 1)
+
+        # Keep the body as received; the response cache can store it compressed.
+        raw_body = body_bytes
+        gzipped = response_headers.get("content-encoding", "").lower() == "gzip"
+        if gzipped:
+            import gzip
+            try:
+                body_bytes = gzip.decompress(body_bytes)
+            except Exception as e:
+                raise Exception(f"Failed to decompress gzip data: {e}")
+
+        content = body_bytes.decode("utf-8", errors="replace")
+
+        # --- Caching logic ---
+        if code in (200, 301, 404):
+            allow_cache = False
+            expire_time_val = None
+            cache_control = response_headers.get("cache-control")
+            if cache_control:
+                cache_control = cache_control.lower().strip()
+                if cache_control == "no-store":
+                    allow_cache = False
+                elif cache_control.startswith("max-age=") and "," not in cache_control:
+                    try:
+                        max_age = int(cache_control[len("max-age="):])
+                        allow_cache = True
+                        expire_time_val = time.time() + max_age
+                    except ValueError:
+                        allow_cache = False
+                else:
+                    allow_cache = False
+            else:
+                allow_cache = True
+                expire_time_val = None
+            if allow_cache:
+                response_cache.put(canonical_url, content, expire_time_val, raw_body,
+                                   "gzip" if gzipped else "identity")
+                print("Caching response for", canonical_url)
+        return content
 
+    def exchange(self, s):
+        """
+        Send the GET request on connection s and read the response. Returns
+        (status code, headers, body bytes, whether s can be reused). Redirect
+        bodies are not read, so their connection is not reused.
+        """
         # Build HTTP/1.1 request with keep-alive and gzip support.
         headers = {
             "Host": self.host,
@@ -166,24 +250,17 @@ class URL:
                 header, value = line_str.split(": ", 1)
                 response_headers[header.lower()] = value.strip()
 
-        # Handle redirects (status codes 300-399).
         if 300 <= code < 400:
-            if redirects_remaining <= 0:
-                raise Exception("Too many redirects")
-            if "location" not in response_headers:
-                raise Exception("Redirect response missing Location header")
-            new_url = response_headers["location"]
-            if new_url.startswith("/"):
-                new_url = f"{self.scheme}://{self.host}{new_url}"
-            print(f"Redirecting to {new_url}")
-            return URL(new_url).request(redirects_remaining - 1)
+            return code, response_headers, None, False
 
-        # Read the response body.
+        # Read the response body. A connection closed partway through is not reused.
+        complete = True
         if response_headers.get("transfer-encoding", "").lower() == "chunked":
             body_bytes = b""
             while True:
                 chunk_size_line = response.readline()
                 if not chunk_size_line:
+                    complete = False
                     break
                 chunk_size_str = chunk_size_line.decode("utf-8").strip()
                 try:
@@ -199,42 +276,13 @@ class URL:
         elif "content-length" in response_headers:
             length = int(response_headers["content-length"])
             body_bytes = response.read(length)
+            complete = len(body_bytes) == length
         else:
-            body_bytes = response.read()
+            # Without framing the body ends when the server closes the connection.
+            return code, response_headers, response.read(), False
 
-        if response_headers.get("content-encoding", "").lower() == "gzip":
-            try:
-                body_bytes = gzip.decompress(body_bytes)
-            except Exception as e:
-                raise Exception(f"Failed to decompress gzip data: {e}")
-
-        content = body_bytes.decode("utf-8", errors="replace")
-
-        # --- Caching logic ---
-        if code in (200, 301, 404):
-            allow_cache = False
-            expire_time_val = None
-            cache_control = response_headers.get("cache-control")
-            if cache_control:
-                cache_control = cache_control.lower().strip()
-                if cache_control == "no-store":
-                    allow_cache = False
-                elif cache_control.startswith("max-age=") and "," not in cache_control:
-                    try:
-                        max_age = int(cache_control[len("max-age="):])
-                        allow_cache = True
-                        expire_time_val = time.time() + max_age
-                    except ValueError:
-                        allow_cache = False
-                else:
-                    allow_cache = False
-            else:
-                allow_cache = True
-                expire_time_val = None
-            if allow_cache:
-                response_cache[canonical_url] = (content, expire_time_val)
-                print("Caching response for", canonical_url)
-        return content
+        reusable = complete and response_headers.get("connection", "").lower() != "close"
+        return code, response_headers, body_bytes, reusable
 
     def get_url_without_view_source(self):
         """Return the URL string without the view-source: prefix"""
@@ -248,100 +296,3 @@ class URL:
         # Reconstruct HTTP and HTTPS URLs
         port_str = "" if (self.scheme == "http" and self.port == 80) or (self.scheme == "https" and self.port == 443) else f":{self.port}"
         return f"{self.scheme}://{self.host}{port_str}{self.path}"
-        
-    def highlight_html_source(self, html_content):
-        """Syntax highlight HTML content"""
-        from html_parser import HTMLParser
-        
-        # Create a syntax highlighter that extends the HTML parser
-        class SyntaxHighlighter(HTMLParser):
-            def __init__(self, html):
-                super().__init__(html)
-                self.result = []
-                
-            def add_tag(self, text):
-                tag, attributes = self.get_attributes(text)
-                # Don't ignore DOCTYPE or comments in the view-source mode
-                if tag.startswith("!"):
-                    self.result.append(f"<span style='color:blue'>&lt;!{text[1:]}&gt;</span>")
-                    return
-                    
-                # Process tag with appropriate highlighting
-                if tag.startswith("/"):
-                    # Closing tag
-                    self.result.append(f"<span style='color:blue'>&lt;/{tag[1:]}&gt;</span>")
-                else:
-                    # Opening tag
-                    if attributes:
-                        attr_str = " ".join(f'{k}="{v}"' for k, v in attributes.items())
-                        self.result.append(f"<span style='color:blue'>&lt;{tag} {attr_str}&gt;</span>")
-                    else:
-                        self.result.append(f"<span style='color:blue'>&lt;{tag}&gt;</span>")
-                
-            def add_text(self, text):
-                if text.isspace():
-                    self.result.append(text)
-                else:
-                    # Make text content bold
-                    self.result.append(f"<span style='font-weight:bold'>{text}</span>")
-                
-            def parse(self):
-                # Override parse to just collect the highlighted elements
-                text = ""
-                in_tag = False
-                in_comment = False
-                
-                i = 0
-                while i < len(self.body):
-                    c = self.body[i]
-                    
-                    # Special handling for '<' and '>' to convert them to HTML entities
-                    # outside of our special spans
-                    if c == '<' and not in_tag and not in_comment:
-                        # Check for comment start
-                        if i + 3 < len(self.body) and self.body[i:i+4] == '<!--':
-                            if text:
-                                self.add_text(text)
-                                text = ""
-                            in_comment = True
-                            self.result.append("<span style='color:green'>&lt;!--")
-                            i += 4
-                            continue
-                        else:
-                            # Regular tag
-                            if text:
-                                self.add_text(text)
-                                text = ""
-                            in_tag = True
-                            text = ""
-                    elif c == '>' and in_tag:
-                        # Complete the tag
-                        self.add_tag(text)
-                        text = ""
-                        in_tag = False
-                    elif in_comment and i + 2 < len(self.body) and self.body[i:i+3] == '-->':
-                        # End of comment
-                        self.result.append("--&gt;</span>")
-                        in_comment = False
-                        i += 3
-                        continue
-                    else:
-                        # Accumulate text
-                        text += c
-                    i += 1
-                
-                # Handle any remaining text
-                if text:
-                    if in_tag:
-                        self.add_tag(text)
-                    elif in_comment:
-                        self.result.append(text + "</span>")
-                    else:
-                        self.add_text(text)
-                        
-                # Return the highlighted HTML wrapped in a pre tag to preserve formatting
-                return "<pre style='white-space:pre-wrap;font-family:monospace;'>" + "".join(self.result) + "</pre>"
-        
-        # Use our syntax highlighter
-        highlighter = SyntaxHighlighter(html_content)
-        return highlighter.parse()
@@ -0,0 +1,100 @@
+# view_source.py
+import re
+from layout import Layout, Run
+from style import DEFAULT_STYLE
+
+SOURCE_FAMILY = "Courier"
+# Style for each kind of source run; text content is bold.
+RUN_STYLES = {
+    "tag": DEFAULT_STYLE._replace(family=SOURCE_FAMILY, color="blue"),
+    "comment": DEFAULT_STYLE._replace(family=SOURCE_FAMILY, color="green"),
+    "text": DEFAULT_STYLE._replace(family=SOURCE_FAMILY, weight="bold"),
+}
+TAB_SIZE = 4
+# Source lines per InlineBox.
+CHUNK_LINES = 64
+
+# Splits a run into words, horizontal whitespace and newlines, keeping all of them.
+PIECES = re.compile(r"[^\S\n]+|\n|[^\s]+")
+
+
+def source_runs(html):
+    """
+    Tokenize HTML source into (text, kind) runs without building any markup.
+    kind is "tag", "comment" or "text". The runs concatenate back to the
+    original source exactly; unterminated tags and comments run to the end.
+    """
+    i = 0
+    n = len(html)
+    while i < n:
+        start = html.find("<", i)
+        if start == -1:
+            yield html[i:], "text"
+            return
+        if start > i:
+            yield html[i:start], "text"
+        if html.startswith("<!--", start):
+            end = html.find("-->", start + 4)
+            end = n if end == -1 else end + 3
+            yield html[start:end], "comment"
+        else:
+            end = html.find(">", start + 1)
+            end = n if end == -1 else end + 1
+            yield html[start:end], "tag"
+        i = end
+
+
+class SourceLayout(Layout):
+    """
+    Lays out view-source output straight from the source_runs token stream.
+    Whitespace and line breaks are preserved, long lines wrap at the window
+    edge, and every run keeps its highlight color.
+    """
+
+    def premeasure(self, source):
+        # Source runs switch fonts constantly, so pieces are measured lazily.
+        pass
+
+    def build(self, box):
+        source = box.node
+        box.children = []
+        self.block = box
+        self.pending_runs = []
+        self.current = Run()
+        self.lines = 0
+        for text, kind in source_runs(source):
+            style = RUN_STYLES[kind]
+            for piece in PIECES.findall(text):
+                if piece == "\n":
+                    self.newline(style)
+                elif piece.isspace():
+                    self.whitespace(piece, style)
+                else:
+                    self.piece(piece, style)
+        self.end_inline()
+        box.dirty = False
+        box.layout_dirty = True
+
+    def piece(self, text, style):
+        key = style.font_key
+        self.current.add(text, key, style.color, self.metrics.measure(key, text), 0)
+
+    def whitespace(self, text, style):
+        w = self.metrics.measure(style.font_key, text.replace("\t", " " * TAB_SIZE))
+        if self.current.texts:
+            # Widen the gap after the previous piece.
+            self.current.spaces[-1] += w
+        else:
+            # Leading whitespace indents the line.
+            self.current.indent += w
+
+    def newline(self, style):
+        if not self.current.texts:
+            # Blank source lines still take up vertical space.
+            self.current.blank_key = style.font_key
+        self.start_run()
+        # Group source lines into boxes so a resize only rewraps the chunks
+        # that have lines wider than the window.
+        self.lines += 1
+        if self.lines % CHUNK_LINES == 0:
+            self.end_inline()